@@ -1,3 +1,5 @@
 use polyglot;
 db.createCollection("statements");
 db.createCollection("counters");
+
+db.statements.createIndex({ user_id: 1, creation_date: -1, _id: -1 }, { name: "user_history" });
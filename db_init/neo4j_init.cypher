@@ -1,3 +1,8 @@
+CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE;
+CREATE CONSTRAINT laptop_id IF NOT EXISTS FOR (l:Laptop) REQUIRE l.id IS UNIQUE;
+// Serves the stale candidate sweep's range scan on candidates_updated
+CREATE RANGE INDEX user_candidates_updated IF NOT EXISTS FOR (u:User) ON (u.candidates_updated);
+
 CREATE 
   (u1:User {id: 1}),
   (u2:User {id: 2}),
@@ -1,3 +1,14 @@
+-- Password hashing (bcrypt via pgcrypto)
+create extension if not exists pgcrypto;
+
+-- Hash a password with a salted bcrypt hash; raise cost to make brute force slower
+create or replace function hash_password(password text, cost int default 8)
+returns text
+language sql
+as $$
+    select crypt(password, gen_salt('bf', cost));
+$$;
+
 -- User Accounts
 create table users (
     user_id serial primary key,
@@ -43,6 +54,9 @@ create table products (
     stock_quantity int not null,
     price real not null, -- Euro
     attributes jsonb, -- JSON to store product attributes (flexible schema)
+    ram_size int generated always as ((attributes->>'RAM Size')::int) stored, -- GB
+    screen_size numeric generated always as ((attributes->>'Screen Size')::numeric) stored, -- Inches
+    disk_storage_size int generated always as ((attributes->>'Disk Storage Size')::int) stored, -- GB
     created_at timestamp default current_timestamp, 
     updated_at timestamp default current_timestamp
 );
@@ -56,6 +70,14 @@ CREATE INDEX idx_productattr_disk_type ON products ((attributes->>'Disk Type'));
 CREATE INDEX idx_productattr_disk_storage_size ON products ((attributes->>'Disk Storage Size'));
 CREATE INDEX idx_productattr_operating_system ON products ((attributes->>'Operating system'));
 
+-- Containment (@>) filters on arbitrary attributes
+CREATE INDEX idx_productattr_gin ON products USING gin (attributes jsonb_path_ops);
+
+-- Range filters on numeric attributes
+CREATE INDEX idx_product_ram_size ON products (ram_size);
+CREATE INDEX idx_product_screen_size ON products (screen_size);
+CREATE INDEX idx_product_disk_storage_size ON products (disk_storage_size);
+
 -- sequence to assign custom MPNs for refurbished products
 create sequence refurbished_mpn as int increment by 1 start with 1;
 
@@ -116,6 +138,22 @@ before update on products
 for each row
 execute function user_timestamp();
 
+-- Notify listening services whenever the product catalog changes
+create or replace function notify_products_changed()
+returns trigger
+language plpgsql
+as $$
+begin
+    perform pg_notify('products_changed', tg_op);
+    return null;
+end;
+$$;
+
+create trigger products_changed_trigger
+after insert or update or delete or truncate on products
+for each statement
+execute function notify_products_changed();
+
 -- Categories
 INSERT INTO categories (category)
 VALUES ('Office laptop');
@@ -568,28 +606,28 @@ json_strip_nulls(json_build_object('Processor Name', 'Intel Core i7-11700KF', 'G
 
 -- Users table
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('admin', 'password', 'admin@email.com', True);
+VALUES ('admin', hash_password('password'), 'admin@email.com', True);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('user1', 'password1', 'user1@email.com', False);
+VALUES ('user1', hash_password('password1'), 'user1@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('user2', 'password2', 'user2@email.com', False);
+VALUES ('user2', hash_password('password2'), 'user2@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('user3', 'password3', 'user3@email.com', False);
+VALUES ('user3', hash_password('password3'), 'user3@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('user4', 'password4', 'user4@email.com', False);
+VALUES ('user4', hash_password('password4'), 'user4@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('user5', 'password5', 'user5@email.com', False);
+VALUES ('user5', hash_password('password5'), 'user5@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('testuser1', 'password1', 'testuser1@email.com', False);
+VALUES ('testuser1', hash_password('password1'), 'testuser1@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('testuser2', 'password2', 'testuser2@email.com', False);
+VALUES ('testuser2', hash_password('password2'), 'testuser2@email.com', False);
 
 INSERT INTO users (USER_NAME, USER_PASSWORD, USER_EMAIL, ADMIN)
-VALUES ('testuser3', 'password3', 'testuser3@email.com', False);
\ No newline at end of file
+VALUES ('testuser3', hash_password('password3'), 'testuser3@email.com', False);
\ No newline at end of file
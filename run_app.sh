@@ -37,6 +37,11 @@ cleanup() {
         kill "$NEO4J_PID" 2>/dev/null && wait "$NEO4J_PID" 2>/dev/null
     fi
 
+    if [[ -n "$ANALYTICS_PID" ]]; then
+        echo "Stopping Neo4j graph analytics job (PID: $ANALYTICS_PID)..."
+        kill "$ANALYTICS_PID" 2>/dev/null && wait "$ANALYTICS_PID" 2>/dev/null
+    fi
+
     echo "Application stopped."
 }
 
@@ -78,6 +83,10 @@ echo "Starting Neo4j Flask service..."
 python src/neo4j_service/neo4j_service.py &
 NEO4J_PID=$!
 
+echo "Starting Neo4j graph analytics job..."
+python src/neo4j_service/graph_analytics.py &
+ANALYTICS_PID=$!
+
 sleep 3
 echo "Starting Console Application..."
 python -i src/console_app.py
@@ -1,5 +1,11 @@
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date
+from cassandra.query import BatchStatement, BatchType
+import threading
+import logging
+import base64
+import json
+import time
 
 from cassandra_connection import CASSANDRA_CONNECTION
 from flask import Flask, request, jsonify
@@ -9,12 +15,39 @@ class CASSANDRA_SERVICE():
     _QUERIES_DIR = "cql"
     _OPS = {
         "CreateLog": _BASE_DIR / _QUERIES_DIR / "create_log.cql",
-        "ReadLog": _BASE_DIR / _QUERIES_DIR / "read_log.cql"
+        "CreateLogDay": _BASE_DIR / _QUERIES_DIR / "create_log_day.cql",
+        "ReadLog": _BASE_DIR / _QUERIES_DIR / "read_log.cql",
+        "ReadLogDays": _BASE_DIR / _QUERIES_DIR / "read_log_days.cql"
+    }
+    # Default read window when since/until are not given
+    LOG_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    LOG_END = datetime(9999, 12, 31, tzinfo=timezone.utc)
+    WRITE_PARAMS = {
+        "max_in_flight": 512, # Queued log writes before create_log blocks the caller
+        "timeout": 10 # Seconds to wait for an in-flight slot
+    }
+    BUFFER_PARAMS = {
+        "capacity": 10000, # Buffered events before producers block
+        "batch_size": 100, # Rows per unlogged batch, and the size that triggers an early flush
+        "flush_interval": 0.05, # Seconds between time-based flushes
+        "timeout": 10 # Seconds a producer waits for buffer space
     }
 
     def __init__(self):
         connection = CASSANDRA_CONNECTION("polyglot_logs")
         self.cassandra = connection.cluster
+        self._prepared = {op: self.cassandra.prepare(self._fetch_query(op)) for op in self._OPS}
+
+        self._in_flight = threading.BoundedSemaphore(self.WRITE_PARAMS["max_in_flight"])
+        self._lock = threading.Lock()
+        self._pending = {} # user_id -> futures of writes not yet acknowledged
+        self._stats = {"queued": 0, "written": 0, "failed": 0, "in_flight": 0, "flushes": 0}
+        self._last_timestamp = 0
+
+        self._buffer = [] # Bound CreateLog parameters waiting for the next flush
+        self._buffer_ready = threading.Condition()
+        self._flush_lock = threading.Lock()
+        threading.Thread(target=self._flush_loop, name="cassandra-log-flush", daemon=True).start()
 
     def _fetch_query(self, op: str) -> str:
         if op not in self._OPS:
@@ -22,62 +55,275 @@ class CASSANDRA_SERVICE():
         
         with open(self._OPS[op], 'r') as file:
             return file.read()
+
+    def _write_done(self, _, user_id: int, future, events: int, failed: bool = False):
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                pending.discard(future)
+                if not pending:
+                    del self._pending[user_id]
+            self._stats["in_flight"] -= 1
+            self._stats["failed" if failed else "written"] += events
+        self._in_flight.release()
+
+    def _write_failed(self, error, user_id: int, future, events: int):
+        logging.error(f"Log write of {events} events for user {user_id} failed: {error}")
+        self._write_done(None, user_id, future, events, failed=True)
+
+    def _execute_async(self, user_id: int, statement, params: tuple, events: int = 1):
+        # Bound the number of unacknowledged writes so a slow cluster pushes back on callers
+        if not self._in_flight.acquire(timeout=self.WRITE_PARAMS["timeout"]):
+            raise TimeoutError("Too many log writes in flight.")
+
+        try:
+            future = self.cassandra.execute_async(statement, params)
+        except Exception:
+            self._in_flight.release()
+            raise
+
+        with self._lock:
+            self._pending.setdefault(user_id, set()).add(future)
+            self._stats["queued"] += events
+            self._stats["in_flight"] += 1
+        future.add_callbacks(
+            self._write_done, self._write_failed,
+            callback_args=(user_id, future, events), errback_args=(user_id, future, events)
+        )
+        return future
+
+    def _timestamp(self) -> datetime:
+        # Log rows are keyed by millisecond timestamp, so events buffered together need distinct ones
+        now = int(time.time() * 1000)
+        with self._lock:
+            now = max(now, self._last_timestamp + 1)
+            self._last_timestamp = now
+        return datetime.fromtimestamp(now / 1000, timezone.utc)
+
+    def _buffer_events(self, events: list):
+        capacity = self.BUFFER_PARAMS["capacity"]
+        with self._buffer_ready:
+            # Block producers while the buffer is full; an oversized batch is admitted into an empty buffer
+            if not self._buffer_ready.wait_for(
+                lambda: len(self._buffer) + len(events) <= capacity or not self._buffer,
+                timeout=self.BUFFER_PARAMS["timeout"]
+            ):
+                raise TimeoutError("Log buffer is full.")
+
+            self._buffer.extend(events)
+            if len(self._buffer) >= self.BUFFER_PARAMS["batch_size"]:
+                self._buffer_ready.notify_all()
+
+    def flush(self) -> int:
+        # Held across take and submit so a reader's flush waits for one already in progress
+        with self._flush_lock:
+            with self._buffer_ready:
+                events, self._buffer = self._buffer, []
+                self._buffer_ready.notify_all()
+            if not events:
+                return 0
+
+            partitions, dropped = {}, 0
+            for user_id, timestamp, *event in events:
+                day = timestamp.date()
+                row = (user_id, day, timestamp, *event)
+                try:
+                    bound = self._prepared['CreateLog'].bind(row)
+                except Exception as e: # Retrying cannot fix a row the driver refuses to bind
+                    logging.error(f"Dropping log event for user {user_id!r}: {e}")
+                    dropped += 1
+                    continue
+                partitions.setdefault((user_id, day), []).append((row, bound))
+            if dropped:
+                with self._lock:
+                    self._stats["failed"] += dropped
+
+            batch_size = self.BUFFER_PARAMS["batch_size"]
+            remaining = list(partitions.values())
+            try:
+                while remaining: # Unlogged batches stay within one (userId, day) partition
+                    rows = remaining[0]
+                    user_id, day = rows[0][0][0], rows[0][0][1]
+                    self._execute_async(user_id, self._prepared['CreateLogDay'], (user_id, day), 0)
+                    while rows:
+                        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                        for _, bound in rows[:batch_size]:
+                            batch.add(bound)
+                        self._execute_async(user_id, batch, None, len(rows[:batch_size]))
+                        rows = remaining[0] = rows[batch_size:]
+                    remaining.pop(0)
+            except TimeoutError:
+                # Backpressure must not drop events: unsent rows go back ahead of newer ones
+                unsent = [(row[0], *row[2:]) for rows in remaining for row, _ in rows]
+                with self._buffer_ready:
+                    self._buffer[:0] = unsent
+                raise
+            except Exception:
+                with self._lock:
+                    self._stats["failed"] += sum(len(rows) for rows in remaining)
+                raise
+
+            with self._lock:
+                self._stats["flushes"] += 1
+            return len(events)
+
+    def _flush_loop(self):
+        while True:
+            with self._buffer_ready:
+                self._buffer_ready.wait_for(
+                    lambda: len(self._buffer) >= self.BUFFER_PARAMS["batch_size"],
+                    timeout=self.BUFFER_PARAMS["flush_interval"]
+                )
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Log flush failed: {e}")
+
+    def _wait_for_writes(self, user_id: int):
+        # Reads see the caller's own queued writes
+        with self._lock:
+            pending = list(self._pending.get(user_id, ()))
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass # Already reported by _write_failed
         
     def create_log(self, user_id: int, action: str, parameters: dict, tags: list) -> bool:
-        query = self._fetch_query('CreateLog')
-        current_time = datetime.now(timezone.utc)
-        self.cassandra.execute(
-            query, 
-            (user_id, current_time, action, parameters, tags)
-        )
- 
+        self._buffer_events([(user_id, self._timestamp(), action, parameters, tags)])
         return True
+
+    def create_logs(self, events: list) -> int:
+        self._buffer_events([
+            (x['user_id'], self._timestamp(), x['action'], x['parameters'], x['tags'])
+            for x in events
+        ])
+        return len(events)
     
-    def read_log(self, user_id: int, limit: int = 10):
+    def _encode_page_token(self, day: date, paging_state: bytes) -> str:
+        token = {"day": day.isoformat(), "state": paging_state.hex() if paging_state is not None else None}
+        return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+    def _decode_page_token(self, page_token: str) -> tuple:
+        try:
+            token = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+            state = bytes.fromhex(token["state"]) if token["state"] is not None else None
+            return date.fromisoformat(token["day"]), state
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid page token")
+
+    def read_log(self, user_id: int, limit: int = 10, since: datetime = None, until: datetime = None, page_token: str = None) -> tuple:
+        # A page token resumes its day at the paging state, or starts below that day when the state is None;
+        # callers must repeat the same since/until with it
+        since = (since or self.LOG_EPOCH).astimezone(timezone.utc)
+        until = (until or self.LOG_END).astimezone(timezone.utc)
         output = []
-        query = self._fetch_query('ReadLog')
-        rows = self.cassandra.execute(
-            query, 
-            (user_id, limit)
-        )
-        for row in rows:
-            output.append({
-                "userId": row.userid,
-                "timestamp": row.timestamp,
-                "action": row.action,
-                "parameters": dict(row.parameters) if row.parameters is not None else None,
-                "tags": row.tags
-            })
+        self.flush()
+        self._wait_for_writes(user_id)
+
+        resume_day, paging_state = None, None
+        last_day = until.date()
+        if page_token is not None:
+            resume_day, paging_state = self._decode_page_token(page_token)
+            last_day = min(last_day, resume_day)
+
+        days = self.cassandra.execute(self._prepared['ReadLogDays'], (user_id, since.date(), last_day))
+        for row in days: # Newest bucket first
+            if row.day.date() == resume_day and paging_state is None:
+                continue # The previous page ended exactly at the end of this bucket
 
-        return output
+            state = paging_state if row.day.date() == resume_day else None
+            while len(output) < limit:
+                bound = self._prepared['ReadLog'].bind((user_id, row.day, since, until))
+                bound.fetch_size = limit - len(output)
+                result = self.cassandra.execute(bound, paging_state=state)
+                output += [self._log_entry(x) for x in result.current_rows]
+                state = result.paging_state
+                if state is None:
+                    break
+
+            if len(output) >= limit:
+                return output, self._encode_page_token(row.day.date(), state)
+
+        return output, None
+
+    def _log_entry(self, row) -> dict:
+        return {
+            "userId": row.userid,
+            "timestamp": row.timestamp,
+            "action": row.action,
+            "parameters": dict(row.parameters) if row.parameters is not None else None,
+            "tags": row.tags
+        }
+
+    def write_stats(self) -> dict:
+        with self._buffer_ready:
+            buffered = len(self._buffer)
+        with self._lock:
+            return dict(self._stats, buffered=buffered, max_in_flight=self.WRITE_PARAMS["max_in_flight"])
 
 
 app = Flask(__name__)
 cassandra_service = CASSANDRA_SERVICE()
 
+def _log_event(params: dict) -> dict:
+    user_id = params.get('user_id')
+    action = params.get('action')
+    tags = params.get('tags', [])
+    parameters = params.get('parameters', {})
+
+    if not user_id or not action:
+        raise ValueError("Both 'user_id' and 'action' are required")
+    # Rows are bound on a later flush, so anything the driver would refuse is rejected here
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        raise ValueError("'user_id' must be an integer")
+    if not isinstance(action, str):
+        raise ValueError("'action' must be a string")
+    if not isinstance(tags, list) or not all(isinstance(x, str) for x in tags):
+        raise ValueError("'tags' must be a list of strings")
+    
+    if isinstance(parameters, dict):
+        parameters = {k: str(v) for k, v in parameters.items()}
+    else:
+        raise ValueError("'parameters' must be a dictionary")
+
+    return {"user_id": user_id, "action": action, "parameters": parameters, "tags": tags}
+
+def _log_time(value: str) -> datetime:
+    # ISO-8601; naive times are taken as UTC
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
 @app.route('/log/create', methods=['POST'])
 def log_create():
     try:
         params = request.json if request.is_json else {}
-        user_id = params.get('user_id')
-        action = params.get('action')
-        tags = params.get('tags', [])
-        parameters = params.get('parameters', {})
-
-        if not user_id or not action:
-            raise ValueError("Both 'user_id' and 'action' are required")
-        if not isinstance(tags, list):
-            raise ValueError("'tags' must be a list")
-        
-        if isinstance(parameters, dict):
-            parameters = {k: str(v) for k, v in parameters.items()}
-        else:
-            raise ValueError("'parameters' must be a dictionary")
+        event = _log_event(params)
 
-        result = cassandra_service.create_log(user_id, action, parameters, tags)
+        result = cassandra_service.create_log(event['user_id'], event['action'], event['parameters'], event['tags'])
         return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+@app.route('/log/create_batch', methods=['POST'])
+def log_create_batch():
+    try:
+        params = request.json if request.is_json else {}
+        events = params.get('events')
+
+        if not isinstance(events, list) or not all(isinstance(x, dict) for x in events):
+            raise ValueError("'events' must be a list of objects")
+
+        result = cassandra_service.create_logs([_log_event(x) for x in events])
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
@@ -86,20 +332,33 @@ def log_read():
     try:
         user_id = request.args.get('user_id', type=int)
         limit = request.args.get('limit', type=int, default=10)
+        since = request.args.get('since', type=_log_time)
+        until = request.args.get('until', type=_log_time)
+        page_token = request.args.get('page_token')
 
         if user_id is None:
             raise ValueError("'user_id' is required as a query parameter")
+        if limit <= 0:
+            raise ValueError("'limit' must be a positive integer")
 
-        result = cassandra_service.read_log(user_id, limit)
-        return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+        result, next_page_token = cassandra_service.read_log(user_id, limit, since, until, page_token)
+        return jsonify({"status": "success", "data": result, "next_page_token": next_page_token}), 200
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/log/stats', methods=['GET'])
+def log_stats():
+    try:
+        result = cassandra_service.write_stats()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/')
 def health_check():
     return jsonify({"status": "running", "message": "CASSANDRA Service is active"}), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5004, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5004, debug=True)
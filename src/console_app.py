@@ -1,6 +1,11 @@
 import requests
 import logging
+import time
+import json
+from datetime import datetime
 from functools import wraps
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 ENDPOINTS = {
     'PSQL': 'http://127.0.0.1:5001',
@@ -14,18 +19,28 @@ SERVICES = {
     'PSQL': {
         'CheckHealth': ENDPOINTS['PSQL'] + '/',
         'FetchProducts': ENDPOINTS['PSQL'] + '/fetch_products',
+        'FetchFacets': ENDPOINTS['PSQL'] + '/fetch_products/facets',
+        'FetchProductsBatch': ENDPOINTS['PSQL'] + '/products/batch',
         'UserLogin': ENDPOINTS['PSQL'] + '/user_login',
+        'AuthLogin': ENDPOINTS['PSQL'] + '/auth/login',
         'GetUserId': ENDPOINTS['PSQL'] + '/get_user_id',
-        'IsAdmin': ENDPOINTS['PSQL'] + '/is_admin'
+        'IsAdmin': ENDPOINTS['PSQL'] + '/is_admin',
+        'PoolStats': ENDPOINTS['PSQL'] + '/pool_stats',
+        'CacheStats': ENDPOINTS['PSQL'] + '/cache_stats',
+        'CacheInvalidate': ENDPOINTS['PSQL'] + '/cache_invalidate'
     },
     'REDIS': {
         'CheckHealth': ENDPOINTS['REDIS'] + '/',
         'CreateSession': ENDPOINTS['REDIS'] + '/session/create_session',
+        'BootstrapSession': ENDPOINTS['REDIS'] + '/session/bootstrap',
         'DropSession': ENDPOINTS['REDIS'] + '/session/drop_session',
         'SessionExists': ENDPOINTS['REDIS'] + '/session/session_exists',
+        'TouchSessions': ENDPOINTS['REDIS'] + '/session/touch_many',
         'UserHasActiveSession': ENDPOINTS['REDIS'] + '/session/user_has_active_session',
         'CreateCart': ENDPOINTS['REDIS'] + '/cart/create',
         'DeleteCart': ENDPOINTS['REDIS'] + '/cart/delete',
+        'ResetCart': ENDPOINTS['REDIS'] + '/cart/reset',
+        'ReapCarts': ENDPOINTS['REDIS'] + '/cart/reap',
         'GetCart': ENDPOINTS['REDIS'] + '/cart/get',
         'UpdateCart': ENDPOINTS['REDIS'] + '/cart/update',
         'CartExists': ENDPOINTS['REDIS'] + '/cart/exists',
@@ -34,33 +49,94 @@ SERVICES = {
     'MONGODB': {
         'CheckHealth': ENDPOINTS['MONGODB'] + '/',
         'StatementCreate': ENDPOINTS['MONGODB'] + '/statement/create',
+        'StatementCreateMany': ENDPOINTS['MONGODB'] + '/statement/create_many',
         'StatementGet': ENDPOINTS['MONGODB'] + '/statement/get',
-        'StatementRead': ENDPOINTS['MONGODB'] + '/statement/read'
+        'StatementRead': ENDPOINTS['MONGODB'] + '/statement/read',
+        'AnalyticsSpend': ENDPOINTS['MONGODB'] + '/analytics/spend',
+        'AnalyticsTopProducts': ENDPOINTS['MONGODB'] + '/analytics/top_products',
+        'AnalyticsMonthlyOrders': ENDPOINTS['MONGODB'] + '/analytics/monthly_orders',
+        'AnalyticsRebuild': ENDPOINTS['MONGODB'] + '/analytics/rebuild'
     },
     'CASSANDRA': {
         'CheckHealth': ENDPOINTS['CASSANDRA'] + '/',
         'LogCreate': ENDPOINTS['CASSANDRA'] + '/log/create',
-        'LogRead': ENDPOINTS['CASSANDRA'] + '/log/read'
+        'LogCreateBatch': ENDPOINTS['CASSANDRA'] + '/log/create_batch',
+        'LogRead': ENDPOINTS['CASSANDRA'] + '/log/read',
+        'LogStats': ENDPOINTS['CASSANDRA'] + '/log/stats'
     },
     'NEO4J': {
         'CheckHealth': ENDPOINTS['NEO4J'] + '/',
         'FollowUser': ENDPOINTS['NEO4J'] + '/user/follow',
         'Purchase': ENDPOINTS['NEO4J'] + '/user/purchase',
-        'Recommend': ENDPOINTS['NEO4J'] + '/user/recommend'
+        'PurchaseBatch': ENDPOINTS['NEO4J'] + '/user/purchase_batch',
+        'Recommend': ENDPOINTS['NEO4J'] + '/user/recommend',
+        'RefreshRecommendations': ENDPOINTS['NEO4J'] + '/user/recommend/refresh',
+        'ExportGraph': ENDPOINTS['NEO4J'] + '/graph/export'
     }
 }
 
+class TimeoutHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None: # Calls without an explicit timeout get the adapter default
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
 class ConsoleApp:
+    HTTP_PARAMS = {
+        "pool_maxsize": 10, # Keep-alive connections kept per service
+        "retries": 3,
+        "backoff_factor": 0.2, # Seconds, doubled per retry
+        "timeout": (3.05, 30) # Connect and read timeouts in seconds
+    }
+    # Seconds between session expiry extensions while the user is active
+    SESSION_TOUCH_INTERVAL = 60
+
     def __init__(self):
         self.active_user = None
         self.active_user_id = -1
         self.active_session = None
         self.active_cart = None
         self.is_admin = False
+        self._last_touch = float('-inf')
 
+        self._sessions = {endpoint: self._create_http_session() for endpoint in ENDPOINTS}
         self._check_health()
     
     # Service
+    def _create_http_session(self) -> requests.Session:
+        # Only idempotent methods are retried; a POST is never sent twice
+        retry = Retry(
+            total=self.HTTP_PARAMS["retries"],
+            backoff_factor=self.HTTP_PARAMS["backoff_factor"],
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False
+        )
+        adapter = TimeoutHTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.HTTP_PARAMS["pool_maxsize"],
+            max_retries=retry,
+            timeout=self.HTTP_PARAMS["timeout"]
+        )
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _http(self, endpoint: str) -> requests.Session:
+        if (session := self._sessions.get(endpoint)) is None:
+            raise RuntimeError(f"Endpoint {endpoint} is not available")
+        return session
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+
     def _check_health(self):
         self.psql_health = self._check_service_health('PSQL')
         self.redis_health = self._check_service_health('REDIS')
@@ -85,7 +161,7 @@ class ConsoleApp:
 
     def _check_service_health(self, endpoint: str) -> bool:
         try:
-            resp = requests.get(self._service(endpoint, 'CheckHealth'), timeout=5)
+            resp = self._http(endpoint).get(self._service(endpoint, 'CheckHealth'), timeout=5)
             if resp.status_code == 200:
                 data = resp.json()
                 return data.get("status") == "running"
@@ -111,7 +187,7 @@ class ConsoleApp:
         if (user_name is None):
             raise ValueError("user_name is None")
 
-        resp = requests.get(
+        resp = self._http('PSQL').get(
             self._service('PSQL', 'GetUserId'),
             json={
                 "user_name": user_name,
@@ -121,7 +197,7 @@ class ConsoleApp:
         return resp.json()['data']
     
     def _user_login(self,  user_name: str, user_password: str) -> bool:
-        resp = requests.post(
+        resp = self._http('PSQL').post(
             self._service('PSQL', 'UserLogin'),
             json={
                 "user_name": user_name,
@@ -131,11 +207,22 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
     
+    def _auth_login(self, user_name: str, user_password: str) -> dict:
+        resp = self._http('PSQL').post(
+            self._service('PSQL', 'AuthLogin'),
+            json={
+                "user_name": user_name,
+                "user_password": user_password
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+
     def _is_admin(self, user_name: str) -> str:
         if (user_name is None):
             raise ValueError("user_name is None")
 
-        resp = requests.get(
+        resp = self._http('PSQL').get(
             self._service('PSQL', 'IsAdmin'),
             params={
                 "user_name": user_name,
@@ -147,16 +234,74 @@ class ConsoleApp:
     
     # Products
     def _fetch_products(self, filter: dict) -> dict:
-        resp = requests.get(
+        resp = self._http('PSQL').get(
             self._service('PSQL', 'FetchProducts'),
             json=filter
         )
         resp.raise_for_status()
         return resp.json()['data']
 
+    def _fetch_products_page(self, filter: dict, limit: int, after_id: int = None) -> tuple:
+        params = dict(filter, limit=limit)
+        if after_id is not None:
+            params['after_id'] = after_id
+
+        resp = self._http('PSQL').get(
+            self._service('PSQL', 'FetchProducts'),
+            json=params
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        return body['data'], body['next_after_id']
+
+    def _stream_products(self, filter: dict):
+        with self._http('PSQL').get(
+            self._service('PSQL', 'FetchProducts'),
+            json=dict(filter, stream=True),
+            stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def _fetch_products_batch(self, ids: list, columns: list = None) -> list:
+        resp = self._http('PSQL').post(
+            self._service('PSQL', 'FetchProductsBatch'),
+            json={
+                'ids': ids,
+                'columns': columns
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _fetch_facets(self, filter: dict) -> dict:
+        resp = self._http('PSQL').get(
+            self._service('PSQL', 'FetchFacets'),
+            json=filter
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _pool_stats(self) -> dict:
+        resp = self._http('PSQL').get(self._service('PSQL', 'PoolStats'))
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _cache_stats(self) -> dict:
+        resp = self._http('PSQL').get(self._service('PSQL', 'CacheStats'))
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _invalidate_caches(self) -> bool:
+        resp = self._http('PSQL').post(self._service('PSQL', 'CacheInvalidate'))
+        resp.raise_for_status()
+        return resp.json()['data']
+
     # Session
     def _create_session(self, user_id: int) -> str:
-        resp = requests.post(
+        resp = self._http('REDIS').post(
             self._service('REDIS', 'CreateSession'),
             json={'user_id': user_id}
         )
@@ -164,8 +309,17 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
         
+    def _bootstrap_session(self, user_id: int) -> dict:
+        resp = self._http('REDIS').post(
+            self._service('REDIS', 'BootstrapSession'),
+            json={'user_id': user_id}
+        )
+        
+        resp.raise_for_status()
+        return resp.json()['data']
+
     def _drop_session(self, user_id: int) -> None:
-        resp = requests.post(
+        resp = self._http('REDIS').post(
             self._service('REDIS', 'DropSession'),
             json={'user_id': user_id}
         )
@@ -177,7 +331,7 @@ class ConsoleApp:
         if session_id is None:
             return False
         
-        resp = requests.get(
+        resp = self._http('REDIS').get(
             self._service('REDIS', 'SessionExists'),
             params={
                 'session_id': session_id
@@ -186,8 +340,28 @@ class ConsoleApp:
         resp.raise_for_status() 
         return resp.json()['data']
 
+    def _touch_sessions(self, session_ids: list) -> int:
+        resp = self._http('REDIS').post(
+            self._service('REDIS', 'TouchSessions'),
+            json={
+                'session_ids': session_ids
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _touch_active_session(self):
+        # Activity slides the session expiry; at most one touch per SESSION_TOUCH_INTERVAL, batched server-side
+        if not self.redis_health or self.active_session is None:
+            return
+        if time.monotonic() - self._last_touch < self.SESSION_TOUCH_INTERVAL:
+            return
+
+        self._touch_sessions([self.active_session])
+        self._last_touch = time.monotonic()
+
     def _user_has_active_session(self, user_id: int) -> bool:
-        resp = requests.get(
+        resp = self._http('REDIS').get(
             self._service('REDIS', 'UserHasActiveSession'),
             params={
                 'user_id': user_id
@@ -198,7 +372,7 @@ class ConsoleApp:
 
     # Cart
     def _create_cart(self, user_id: int) -> str:
-        resp = requests.post(
+        resp = self._http('REDIS').post(
             self._service('REDIS', 'CreateCart'),
             json={
                 'user_id': user_id
@@ -208,7 +382,7 @@ class ConsoleApp:
         return resp.json()['data']
 
     def _drop_cart(self, user_id: int) -> str | None:
-        resp = requests.post(
+        resp = self._http('REDIS').post(
             self._service('REDIS', 'DeleteCart'),
             json={
                 'user_id': user_id
@@ -217,8 +391,23 @@ class ConsoleApp:
         resp.raise_for_status()
         return None
 
+    def _reset_cart(self, user_id: int) -> str:
+        resp = self._http('REDIS').post(
+            self._service('REDIS', 'ResetCart'),
+            json={
+                'user_id': user_id
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+
+    def _reap_carts(self) -> dict:
+        resp = self._http('REDIS').post(self._service('REDIS', 'ReapCarts'))
+        resp.raise_for_status()
+        return resp.json()['data']
+
     def _get_user_cart(self, user_id: int) -> str:
-        resp = requests.get(
+        resp = self._http('REDIS').get(
             self._service('REDIS', 'GetCart'),
             params={
                 'user_id': user_id
@@ -228,7 +417,7 @@ class ConsoleApp:
         return resp.json()['data']
 
     def _user_cart_exists(self, user_id: int) -> str:
-        resp = requests.get(
+        resp = self._http('REDIS').get(
             self._service('REDIS', 'CartExists'),
             params={
                 'user_id': user_id
@@ -238,7 +427,7 @@ class ConsoleApp:
         return resp.json()['data']
 
     def _cart_update(self, user_id: int, product_id: int, quantity: int) -> str:
-        resp = requests.post(
+        resp = self._http('REDIS').post(
             self._service('REDIS', 'UpdateCart'),
             json={
                 'user_id': user_id,
@@ -250,7 +439,7 @@ class ConsoleApp:
         return {int(k): int(v) for k, v in resp.json()['data'].items()}
 
     def _cart_read(self, user_id: int) -> dict:
-        resp = requests.get(
+        resp = self._http('REDIS').get(
             self._service('REDIS', 'CartRead'),
             params={
                 'user_id': user_id
@@ -260,19 +449,30 @@ class ConsoleApp:
         return {int(k): int(v) for k, v in resp.json()['data'].items()}
     
     # Statements
-    def _create_statement(self, user_id: int, purchase: dict) -> bool:
-        resp = requests.post(
+    def _create_statement(self, user_id: int, purchase: dict, prices: dict) -> bool:
+        resp = self._http('MONGODB').post(
             self._service('MONGODB', 'StatementCreate'),
             json={
                 'user_id': user_id,
-                'purchase': purchase
+                'purchase': purchase,
+                'prices': prices
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _create_statements(self, statements: list) -> list:
+        resp = self._http('MONGODB').post(
+            self._service('MONGODB', 'StatementCreateMany'),
+            json={
+                'statements': statements
             }
         )
         resp.raise_for_status()
         return resp.json()['data']
     
     def _get_statements(self, user_id: int) -> list:
-        resp = requests.get(
+        resp = self._http('MONGODB').get(
             self._service('MONGODB', 'StatementGet'),
             params={
                 'user_id': user_id
@@ -281,24 +481,76 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
     
-    def _read_statement(self, statement_id: int) -> dict:
-        resp = requests.get(
+    def _get_statements_page(self, user_id: int, limit: int, cursor: str = None, summary: bool = False) -> tuple:
+        resp = self._http('MONGODB').get(
+            self._service('MONGODB', 'StatementGet'),
+            params={
+                'user_id': user_id,
+                'limit': limit,
+                'cursor': cursor,
+                'summary': str(summary).lower()
+            }
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        return body['data'], body['next_cursor']
+    
+    def _read_statement(self, statement_id: int, user_id: int = None) -> dict:
+        resp = self._http('MONGODB').get(
             self._service('MONGODB', 'StatementRead'),
             params={
-                'statement_id': statement_id
+                'statement_id': statement_id,
+                'user_id': user_id
             }
         )
         resp.raise_for_status()
         statement = resp.json()['data']
-        statement['purchase'] = {int(k): int(v) for k, v in statement['purchase'].items()}
+        statement['purchase'] = {x['product_id']: x['qty'] for x in statement['purchase']}
         return statement
     
+    def _user_spend(self, user_id: int = None, limit: int = 10) -> list:
+        resp = self._http('MONGODB').get(
+            self._service('MONGODB', 'AnalyticsSpend'),
+            params={
+                'user_id': user_id,
+                'limit': limit
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _top_products(self, user_id: int = None, limit: int = 10) -> list:
+        resp = self._http('MONGODB').get(
+            self._service('MONGODB', 'AnalyticsTopProducts'),
+            params={
+                'user_id': user_id,
+                'limit': limit
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _monthly_orders(self, user_id: int) -> list:
+        resp = self._http('MONGODB').get(
+            self._service('MONGODB', 'AnalyticsMonthlyOrders'),
+            params={
+                'user_id': user_id
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _rebuild_rollups(self) -> dict:
+        resp = self._http('MONGODB').post(self._service('MONGODB', 'AnalyticsRebuild'))
+        resp.raise_for_status()
+        return resp.json()['data']
+    
     # Logs
     def _create_log(self, user_id: int, action: str, parameters: dict, tags: list) -> bool:
         if not self.cassandra_health:
             return
         
-        resp = requests.post(
+        resp = self._http('CASSANDRA').post(
             self._service('CASSANDRA', 'LogCreate'),
             json={
                 'user_id': user_id,
@@ -310,8 +562,21 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
     
+    def _create_logs(self, events: list) -> int:
+        if not self.cassandra_health:
+            return
+        
+        resp = self._http('CASSANDRA').post(
+            self._service('CASSANDRA', 'LogCreateBatch'),
+            json={
+                'events': events
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
     def _read_log(self, user_id: int, limit: int = 10) -> list:
-        resp = requests.get(
+        resp = self._http('CASSANDRA').get(
             self._service('CASSANDRA', 'LogRead'),
             params={
                 'user_id': user_id,
@@ -321,9 +586,29 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
     
+    def _read_log_page(self, user_id: int, limit: int, since: datetime = None, until: datetime = None, page_token: str = None) -> tuple:
+        resp = self._http('CASSANDRA').get(
+            self._service('CASSANDRA', 'LogRead'),
+            params={
+                'user_id': user_id,
+                'limit': limit,
+                'since': since.isoformat() if since is not None else None,
+                'until': until.isoformat() if until is not None else None,
+                'page_token': page_token
+            }
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        return body['data'], body['next_page_token']
+    
+    def _log_stats(self) -> dict:
+        resp = self._http('CASSANDRA').get(self._service('CASSANDRA', 'LogStats'))
+        resp.raise_for_status()
+        return resp.json()['data']
+    
     # Recommendatations
     def _follow_user(self, user_id_from: int, user_id_to: int):
-        resp = requests.post(
+        resp = self._http('NEO4J').post(
             self._service('NEO4J', 'FollowUser'),
             json={
                 'user_id_from': user_id_from,
@@ -334,7 +619,7 @@ class ConsoleApp:
         return resp.json()['data']
     
     def _purchase(self, user_id: int, product_id: int):
-        resp = requests.post(
+        resp = self._http('NEO4J').post(
             self._service('NEO4J', 'Purchase'),
             json={
                 'user_id': user_id,
@@ -344,16 +629,46 @@ class ConsoleApp:
         resp.raise_for_status()
         return resp.json()['data']
     
-    def _recommend(self, user_id: int):
-        resp = requests.get(
+    def _purchase_batch(self, user_id: int, product_ids: list) -> int:
+        resp = self._http('NEO4J').post(
+            self._service('NEO4J', 'PurchaseBatch'),
+            json={
+                'user_id': user_id,
+                'product_ids': product_ids
+            }
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _recommend(self, user_id: int, limit: int = None, mode: str = None):
+        resp = self._http('NEO4J').get(
             self._service('NEO4J', 'Recommend'),
             params={
-                'user_id': user_id
+                'user_id': user_id,
+                'limit': limit,
+                'mode': mode
             }
         )
         resp.raise_for_status()
         return resp.json()['data']
     
+    def _refresh_recommendations(self) -> int:
+        resp = self._http('NEO4J').post(
+            self._service('NEO4J', 'RefreshRecommendations')
+        )
+        resp.raise_for_status()
+        return resp.json()['data']
+    
+    def _export_graph(self):
+        with self._http('NEO4J').get(
+            self._service('NEO4J', 'ExportGraph'),
+            stream=True
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if line:
+                    yield json.loads(line)
+    
     # User
     def fetch_products(self, filter: dict = None) -> dict:
         if not self.psql_health:
@@ -372,18 +687,18 @@ class ConsoleApp:
         if (self.active_session):
             return f"Already logged in as {self.active_user}"
 
-        if (not self._user_login(user_name, user_password)):
+        principal = self._auth_login(user_name, user_password)
+        if (not principal['verified']):
             self._create_log(self.active_user_id, "Login Fail", {}, ["PSQL"])
             return "Incorrect credentials"
 
         self.active_user = user_name
-        self.active_user_id = self._get_user_id(self.active_user)
-        self.is_admin = self._is_admin(self.active_user)
-        self.active_session = self._create_session(self.active_user_id)
-        if (self._user_cart_exists(self.active_user_id)):
-            self.active_cart = self._get_user_cart(self.active_user_id)
-        else:
-            self.active_cart = self._create_cart(self.active_user_id)
+        self.active_user_id = principal['user_id']
+        self.is_admin = principal['admin']
+        bootstrap = self._bootstrap_session(self.active_user_id)
+        self.active_session = bootstrap['session_id']
+        self.active_cart = bootstrap['cart_id']
+        self._last_touch = time.monotonic() # A new session starts with its full timeout
 
         self._create_log(self.active_user_id, "Login Success", {
             'user': self.active_user, 
@@ -420,27 +735,34 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
 
         self._create_log(self.active_user_id, "Update Cart", {'product_id': product_id, 'quantity': quantity}, ["REDIS"])
         return self._cart_update(self.active_user_id, product_id, quantity)
 
     def purchase(self) -> str:
-        if not self.redis_health or not self.mongodb_health:
-            raise RuntimeError("Cannot purchase, REDIS or MONGODB service is down")
+        if not self.redis_health or not self.mongodb_health or not self.psql_health:
+            raise RuntimeError("Cannot purchase, REDIS, MONGODB or PSQL service is down")
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         cart_contents = self._cart_read(self.active_user_id)
         if (len(cart_contents.keys()) == 0):
             return "Cart is empty"
+
+        # Statements are priced at purchase time so totals and spend rollups stay exact
+        products = self._fetch_products_batch(list(cart_contents.keys()), ['id', 'price'])
+        prices = {x['id']: x['price'] for x in products}
+        missing = [x for x in cart_contents if x not in prices]
+        if missing:
+            return f"Products {missing} are no longer available"
         
-        for i in cart_contents.keys():
-            self._purchase(self.active_user_id, i)
+        self._purchase_batch(self.active_user_id, list(cart_contents.keys()))
 
-        statement_id = self._create_statement(self.active_user_id, cart_contents)
-        self._drop_cart(self.active_user_id)
-        self._create_cart(self.active_user_id)
+        statement_id = self._create_statement(self.active_user_id, cart_contents, prices)
+        self.active_cart = self._reset_cart(self.active_user_id)
         self._create_log(self.active_user_id, "Purchase", {'cart_contents': cart_contents}, ["REDIS"])
         return statement_id
 
@@ -450,6 +772,7 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Read Cart", {}, ["REDIS"])
         return self._cart_read(self.active_user_id)
@@ -460,12 +783,12 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
 
         self._create_log(self.active_user_id, "Clear Cart", {}, ["REDIS"])
-        self._drop_cart(self.active_user_id)
-        self._create_cart(self.active_user_id)
+        self.active_cart = self._reset_cart(self.active_user_id)
 
-        return self._cart_read(self.active_user_id)
+        return {} # A freshly reset cart is always empty
 
     def get_statements(self) -> list:
         if not self.mongodb_health:
@@ -473,6 +796,7 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Get Statements", {}, ["MONGODB"])        
         return self._get_statements(self.active_user_id)
@@ -483,16 +807,19 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Read Statement", {'statement_id': statement_id}, ["MONGODB"])
-        user_statements = self.get_statements()
-        if (statement_id not in user_statements):
+        try:
+            statement = self._read_statement(statement_id, self.active_user_id)
+        except requests.HTTPError as e:
+            if e.response.status_code != 400:
+                raise
             self._create_log(self.active_user_id, "Read Statement Fail", {'statement_id': statement_id}, ["MONGODB"])
             return f"Statement {statement_id} does not belong to {self.active_user}"
 
-        
         self._create_log(self.active_user_id, "Read Statement Success", {'statement_id': statement_id}, ["MONGODB"])
-        return self._read_statement(statement_id)
+        return statement
     
     def read_log(self, user_id, limit = 10):
         if not self.cassandra_health:
@@ -500,6 +827,7 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Read Logs", {'filter': {'user_name': user_id}}, ["MONGODB"])
         return self._read_log(user_id, limit)
@@ -510,6 +838,7 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Follow User", {'filter': {'user_id': user_id}}, ["NEO4J"])
         return self._follow_user(self.active_user_id, user_id)
@@ -520,6 +849,7 @@ class ConsoleApp:
         
         if self.active_session is None:
             return "No active session"
+        self._touch_active_session()
         
         self._create_log(self.active_user_id, "Getting recommendations", {}, ["NEO4J"])
         return self._recommend(self.active_user_id)
@@ -0,0 +1,29 @@
+from datetime import date, datetime
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+from werkzeug.http import http_date
+import orjson
+
+class MONGODB_JSON_PROVIDER(JSONProvider):
+    # Non-string keys cover legacy purchase maps; datetimes are passed through to keep Flask's HTTP-date format
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    @staticmethod
+    def _default(o):
+        if isinstance(o, (date, datetime)):
+            return http_date(o)
+        if isinstance(o, ObjectId):
+            return str(o)
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self._default, option=self.OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of round-tripping through str
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._default, option=self.OPTIONS)
+        return self._app.response_class(body, mimetype="application/json")
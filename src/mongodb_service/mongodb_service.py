@@ -1,51 +1,274 @@
 from datetime import datetime, timezone
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
 from flask import Flask, request, jsonify
+import threading
+import logging
+import base64
 
 from mongodb_connection import MONGODB_CONNECTION
+from mongodb_json import MONGODB_JSON_PROVIDER
 
 class MONGODB_SERVICE():
+    # Statement ids reserved from the shared counter per round trip
+    STATEMENT_ID_BLOCK = 100
+    # Newest-first history per user; _id breaks ties between statements created in the same millisecond
+    STATEMENT_HISTORY_INDEX = [("user_id", ASCENDING), ("creation_date", DESCENDING), ("_id", DESCENDING)]
+    STATEMENT_SUMMARY_FIELDS = {"_id": 1, "creation_date": 1, "item_count": 1, "total": 1}
+    ROLLUP_INDEX = [("kind", ASCENDING), ("user_id", ASCENDING)]
+    # Rebuild pipelines for purchase_rollups; create_statement keeps the same documents up to date incrementally
+    ROLLUP_PIPELINES = {
+        "user": [
+            {"$group": {
+                "_id": "$user_id",
+                "orders": {"$sum": 1},
+                "items": {"$sum": "$item_count"},
+                "spend": {"$sum": {"$ifNull": ["$total", 0]}}
+            }},
+            {"$project": {"_id": 0, "user_id": "$_id", "orders": 1, "items": 1, "spend": 1}}
+        ],
+        "month": [
+            {"$group": {
+                "_id": {"user_id": "$user_id", "month": {"$dateToString": {"format": "%Y-%m", "date": "$creation_date"}}},
+                "orders": {"$sum": 1},
+                "spend": {"$sum": {"$ifNull": ["$total", 0]}}
+            }},
+            {"$project": {"_id": 0, "user_id": "$_id.user_id", "month": "$_id.month", "orders": 1, "spend": 1}}
+        ],
+        "product": [
+            {"$unwind": "$purchase"},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "product_id": "$purchase.product_id"},
+                "qty": {"$sum": "$purchase.qty"},
+                "orders": {"$sum": 1},
+                "spend": {"$sum": {"$multiply": ["$purchase.qty", {"$ifNull": ["$purchase.price", 0]}]}}
+            }},
+            {"$project": {"_id": 0, "user_id": "$_id.user_id", "product_id": "$_id.product_id", "qty": 1, "orders": 1, "spend": 1}}
+        ],
+        "global_product": [
+            {"$unwind": "$purchase"},
+            {"$group": {
+                "_id": "$purchase.product_id",
+                "qty": {"$sum": "$purchase.qty"},
+                "orders": {"$sum": 1},
+                "spend": {"$sum": {"$multiply": ["$purchase.qty", {"$ifNull": ["$purchase.price", 0]}]}}
+            }},
+            {"$project": {"_id": 0, "user_id": {"$literal": None}, "product_id": "$_id", "qty": 1, "orders": 1, "spend": 1}}
+        ]
+    }
+
     def __init__(self):
         connection = MONGODB_CONNECTION()
-        self.mongodb = connection.client['polyglot']
+        self.client = connection.client
+        self.mongodb = self.client['polyglot']
+        self.mongodb['statements'].create_index(self.STATEMENT_HISTORY_INDEX, name="user_history")
+        self.mongodb['purchase_rollups'].create_index(self.ROLLUP_INDEX, name="rollup_scope")
 
-    def _get_next_id(self) -> int:
+        self._id_lock = threading.Lock()
+        self._next_id = 1
+        self._block_end = 0 # Last id of the block reserved by this process
+
+        # Multi-document transactions need a replica set or a sharded cluster
+        hello = self.client.admin.command("hello")
+        self._transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    def _reserve_ids(self, count: int) -> int:
         counter = self.mongodb['counters'].find_one_and_update(
             {'_id': 'statement_id'},
-            {'$inc': {'seq': 1}},
+            {'$inc': {'seq': count}},
             upsert=True,
             return_document=ReturnDocument.AFTER
         )
         return counter['seq']
 
-    def create_statement(self, user_id: int, purchase: dict) -> int:
-        statement_id = self._get_next_id()
+    def _allocate_ids(self, count: int) -> list:
+        # Hand out ids from a per-process block so the counter document is written once per block
+        ids = []
+        with self._id_lock:
+            while len(ids) < count:
+                if self._next_id > self._block_end:
+                    size = max(self.STATEMENT_ID_BLOCK, count - len(ids))
+                    self._block_end = self._reserve_ids(size)
+                    self._next_id = self._block_end - size + 1
+
+                take = min(count - len(ids), self._block_end - self._next_id + 1)
+                ids.extend(range(self._next_id, self._next_id + take))
+                self._next_id += take
+        return ids
+
+    def _get_next_id(self) -> int:
+        return self._allocate_ids(1)[0]
+
+    def _purchase_lines(self, purchase: dict, prices: dict) -> list:
+        # Every line is priced so totals and spend rollups never count a purchase as free
+        if not isinstance(prices, dict):
+            raise ValueError("'prices' must map every purchased product to its price")
+
+        lines = []
+        for product_id, qty in purchase.items():
+            price = prices.get(str(product_id))
+            if price is None:
+                raise ValueError(f"Missing price for product {product_id}")
+            lines.append({"product_id": int(product_id), "qty": int(qty), "price": float(price)})
+        return lines
 
-        statement = {
+    def _statement(self, statement_id: int, user_id: int, purchase: dict, prices: dict) -> dict:
+        # Summary fields are stored with the statement so history listings never touch the purchase
+        lines = self._purchase_lines(purchase, prices)
+        total = round(sum(x["price"] * x["qty"] for x in lines), 2)
+
+        return {
             "_id": statement_id,
             "user_id": user_id,
-            "purchase": purchase,
+            "purchase": lines,
+            "item_count": sum(x["qty"] for x in lines),
+            "total": total,
             "creation_date": datetime.now(timezone.utc)
         }
+
+    def _rollup_id(self, kind: str, fields: dict) -> str:
+        # Product rollups with user_id None hold the global totals
+        if kind == "user":
+            return f"user:{fields['user_id']}"
+        if kind == "month":
+            return f"month:{fields['user_id']}:{fields['month']}"
+        return f"product:{fields['user_id']}:{fields['product_id']}"
+
+    def _rollup_updates(self, statement: dict) -> list:
+        user_id = statement["user_id"]
+        month = statement["creation_date"].strftime("%Y-%m")
+        spend = statement["total"]
+
+        def upsert(kind: str, fields: dict, increments: dict) -> UpdateOne:
+            fields = dict(fields, kind=kind)
+            return UpdateOne({"_id": self._rollup_id(kind, fields)}, {"$setOnInsert": fields, "$inc": increments}, upsert=True)
+
+        updates = [
+            upsert("user", {"user_id": user_id}, {"orders": 1, "items": statement["item_count"], "spend": spend}),
+            upsert("month", {"user_id": user_id, "month": month}, {"orders": 1, "spend": spend})
+        ]
+        for line in statement["purchase"]:
+            increments = {"qty": line["qty"], "orders": 1, "spend": line["qty"] * line["price"]}
+            for scope in (user_id, None):
+                updates.append(upsert("product", {"user_id": scope, "product_id": line["product_id"]}, increments))
+        return updates
+
+    def _update_rollups(self, statements: list, session=None):
+        updates = [x for statement in statements for x in self._rollup_updates(statement)]
+        self.mongodb['purchase_rollups'].bulk_write(updates, ordered=False, session=session)
+
+    def _insert_statements(self, statements: list):
+        # Statements and their rollup increments commit together where the deployment supports transactions
+        def write(session=None):
+            self.mongodb['statements'].insert_many(statements, ordered=False, session=session)
+            self._update_rollups(statements, session)
+
+        if self._transactions:
+            with self.client.start_session() as session:
+                session.with_transaction(write)
+            return
+
+        try:
+            write()
+        except PyMongoError as e:
+            # A standalone server can leave rollups behind the inserted statements; /analytics/rebuild recomputes them
+            logging.error(f"Statement write failed, rollups may need a rebuild: {e}")
+            raise
+
+    def create_statement(self, user_id: int, purchase: dict, prices: dict) -> int:
+        statement_id = self._get_next_id()
+        statement = self._statement(statement_id, user_id, purchase, prices)
         
-        self.mongodb['statements'].insert_one(statement)
+        self._insert_statements([statement])
         return statement_id
+
+    def create_statements(self, statements: list) -> list:
+        statement_ids = self._allocate_ids(len(statements))
+        documents = [
+            self._statement(statement_id, x['user_id'], x['purchase'], x['prices'])
+            for statement_id, x in zip(statement_ids, statements)
+        ]
+
+        self._insert_statements(documents)
+        return statement_ids
     
-    def get_statements(self, user_id: int) -> tuple:
-        statements = self.mongodb['statements'].find(
-                {"user_id": user_id},
-                {"_id": 1}  # Only retrieve the _id field
-            )
-        return [x['_id'] for x in statements]
-
-    def read_statement(self, statement_id: int):
-        statement = self.mongodb['statements'].find_one(
-                {"_id": statement_id},
-        )
+    def _encode_cursor(self, statement: dict) -> str:
+        created = int(statement['creation_date'].replace(tzinfo=timezone.utc).timestamp() * 1000)
+        return base64.urlsafe_b64encode(f"{created}:{statement['_id']}".encode()).decode()
+
+    def _decode_cursor(self, cursor: str) -> tuple:
+        try:
+            created, statement_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            return datetime.fromtimestamp(int(created) / 1000, timezone.utc), int(statement_id)
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError("Invalid cursor")
+
+    def get_statements(self, user_id: int, limit: int = None, cursor: str = None, summary: bool = False) -> tuple:
+        query = {"user_id": user_id}
+        if cursor is not None: # Resume strictly after the last statement of the previous page
+            created, statement_id = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"creation_date": {"$lt": created}},
+                {"creation_date": created, "_id": {"$lt": statement_id}}
+            ]
+
+        projection = self.STATEMENT_SUMMARY_FIELDS if summary else {"_id": 1, "creation_date": 1}
+        statements = self.mongodb['statements'].find(query, projection).sort(self.STATEMENT_HISTORY_INDEX[1:])
+        if limit is not None:
+            statements = statements.limit(limit)
+        statements = list(statements)
+
+        next_cursor = None
+        if limit is not None and len(statements) == limit:
+            next_cursor = self._encode_cursor(statements[-1])
+
+        if summary:
+            return statements, next_cursor
+        return [x['_id'] for x in statements], next_cursor
+
+    def read_statement(self, statement_id: int, user_id: int = None):
+        query = {"_id": statement_id}
+        if user_id is not None: # Ownership is part of the lookup, so a foreign statement reads as missing
+            query["user_id"] = user_id
+
+        statement = self.mongodb['statements'].find_one(query)
         return statement
 
+    def _rollups(self, query: dict, sort: list, limit: int = None) -> list:
+        rollups = self.mongodb['purchase_rollups'].find(query, {"_id": 0, "kind": 0}).sort(sort)
+        if limit is not None:
+            rollups = rollups.limit(limit)
+        return list(rollups)
+
+    def user_spend(self, user_id: int = None, limit: int = 10) -> list:
+        if user_id is not None:
+            return self._rollups({"kind": "user", "user_id": user_id}, [("user_id", ASCENDING)])
+        return self._rollups({"kind": "user"}, [("spend", DESCENDING), ("user_id", ASCENDING)], limit)
+
+    def top_products(self, user_id: int = None, limit: int = 10) -> list:
+        # user_id None reads the global product totals
+        return self._rollups({"kind": "product", "user_id": user_id},
+                             [("qty", DESCENDING), ("product_id", ASCENDING)], limit)
+
+    def monthly_orders(self, user_id: int) -> list:
+        return self._rollups({"kind": "month", "user_id": user_id}, [("month", ASCENDING)])
+
+    def rebuild_rollups(self) -> dict:
+        # Recompute every rollup from statement history; meant for maintenance, not concurrent with purchases
+        rollups, counts = [], {}
+        for kind, pipeline in self.ROLLUP_PIPELINES.items():
+            rows = list(self.mongodb['statements'].aggregate(pipeline))
+            counts[kind] = len(rows)
+            rollups += [dict(x, _id=self._rollup_id(kind, x), kind=kind.removeprefix("global_")) for x in rows]
+
+        self.mongodb['purchase_rollups'].delete_many({})
+        if rollups:
+            self.mongodb['purchase_rollups'].insert_many(rollups)
+        return counts
+
     
 app = Flask(__name__)
+app.json = MONGODB_JSON_PROVIDER(app)
 mongodb_service = MONGODB_SERVICE()
 
 @app.route('/statement/create', methods=['POST'])
@@ -54,10 +277,29 @@ def statement_create():
         params = request.json if request.is_json else {}
         user_id = params.get('user_id')
         purchase = params.get('purchase')
+        prices = params.get('prices')
 
-        result = mongodb_service.create_statement(user_id, purchase)
+        result = mongodb_service.create_statement(user_id, purchase, prices)
         return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+@app.route('/statement/create_many', methods=['POST'])
+def statement_create_many():
+    try:
+        params = request.json if request.is_json else {}
+        statements = params.get('statements')
+
+        if not isinstance(statements, list) or not all(isinstance(x, dict) for x in statements):
+            raise ValueError("'statements' must be a list of objects")
+        if not all('user_id' in x and 'purchase' in x and 'prices' in x for x in statements):
+            raise ValueError("Every statement requires 'user_id', 'purchase' and 'prices'")
+
+        result = mongodb_service.create_statements(statements)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -66,10 +308,16 @@ def statement_create():
 def statement_get():
     try:
         user_id = request.args.get('user_id', type=int)
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        summary = request.args.get('summary', default='false').lower() == 'true'
 
-        result = mongodb_service.get_statements(user_id)
-        return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+        if limit is not None and limit <= 0:
+            raise ValueError("'limit' must be a positive integer")
+
+        result, next_cursor = mongodb_service.get_statements(user_id, limit, cursor, summary)
+        return jsonify({"status": "success", "data": result, "next_cursor": next_cursor}), 200
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -78,8 +326,11 @@ def statement_get():
 def statement_read():
     try:
         statement_id = request.args.get('statement_id', type=int)
-        result = mongodb_service.read_statement(statement_id)
+        user_id = request.args.get('user_id', type=int)
+        result = mongodb_service.read_statement(statement_id, user_id)
         if (result is None):
+            if user_id is not None:
+                raise KeyError(f"Statement {statement_id} does not exist for user {user_id}")
             raise KeyError(f"Statement {statement_id} does not exist")
 
         return jsonify({"status": "success", "data": result}), 200
@@ -88,6 +339,54 @@ def statement_read():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/analytics/spend', methods=['GET'])
+def analytics_spend():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        limit = request.args.get('limit', default=10, type=int)
+
+        result = mongodb_service.user_spend(user_id, limit)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/analytics/top_products', methods=['GET'])
+def analytics_top_products():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        limit = request.args.get('limit', default=10, type=int)
+
+        result = mongodb_service.top_products(user_id, limit)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/analytics/monthly_orders', methods=['GET'])
+def analytics_monthly_orders():
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            raise ValueError("'user_id' is required")
+
+        result = mongodb_service.monthly_orders(user_id)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/analytics/rebuild', methods=['POST'])
+def analytics_rebuild():
+    try:
+        result = mongodb_service.rebuild_rollups()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/')
 def health_check():
     return jsonify({"status": "running", "message": "MONGODB Service is active"}), 200
@@ -0,0 +1,5 @@
+MATCH (u:User {id: $user_id})
+OPTIONAL MATCH (u)-[c:CANDIDATE]->(l:Laptop)
+WITH u, c, l
+ORDER BY c.score DESC, l.id
+RETURN u.candidates_updated IS NOT NULL AS computed, collect(l.id)[..$limit] AS ids
@@ -0,0 +1,4 @@
+// Users whose candidate lists can change when these users' purchases or follows change
+UNWIND $user_ids AS user_id
+MATCH (a:User)-[:Follow*0..2]->(u:User {id: user_id})
+RETURN DISTINCT a.id AS id
@@ -0,0 +1,2 @@
+MATCH (a)-[r:Follow|Purchased]->(b)
+RETURN type(r) AS type, a.id AS from, b.id AS to, coalesce(r.count, 1) AS count
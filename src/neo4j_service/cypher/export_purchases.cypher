@@ -0,0 +1,2 @@
+MATCH (u:User)-[:Purchased]->(l:Laptop)
+RETURN u.id AS user_id, l.id AS laptop_id
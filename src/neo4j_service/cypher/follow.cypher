@@ -1,2 +1,2 @@
 MATCH (u_from:User {id: $user_id_from}), (u_to:User {id: $user_id_to})
-CREATE (u_from)-[:Follow]->(u_to)
\ No newline at end of file
+MERGE (u_from)-[:Follow]->(u_to)
\ No newline at end of file
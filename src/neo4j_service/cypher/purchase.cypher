@@ -1,3 +1,6 @@
 MATCH (u:User {id: $user_id}), (l:Laptop {id: $product_id})
-CREATE (u)-[:Purchased]->(l)
+MERGE (u)-[p:Purchased]->(l)
+ON CREATE SET p.count = 1
+ON MATCH SET p.count = coalesce(p.count, 1) + 1
+SET p.purchased_at = datetime()
 RETURN u, l
@@ -0,0 +1,8 @@
+MATCH (u:User {id: $user_id})
+UNWIND $product_ids AS product_id
+MATCH (l:Laptop {id: product_id})
+MERGE (u)-[p:Purchased]->(l)
+ON CREATE SET p.count = 1
+ON MATCH SET p.count = coalesce(p.count, 1) + 1
+SET p.purchased_at = datetime()
+RETURN count(p) AS purchased
@@ -1,2 +1,27 @@
-MATCH (u:User {id: $user_id})-[:Follow]->(followed:User)-[:Purchased]->(l:Laptop)
-RETURN DISTINCT l.id AS id
\ No newline at end of file
+// Ranked candidates per user: purchases by followees (weight 1) and second-degree follows,
+// decayed by purchase age and excluding laptops the user already owns
+UNWIND $user_ids AS user_id
+MATCH (u:User {id: user_id})
+CALL {
+  WITH u
+  CALL {
+    WITH u
+    MATCH (u)-[:Follow]->(f:User)
+    RETURN f, 1.0 AS weight
+    UNION
+    WITH u
+    MATCH (u)-[:Follow]->(:User)-[:Follow]->(f:User)
+    WHERE f <> u AND NOT (u)-[:Follow]->(f)
+    RETURN f, $second_degree_weight AS weight
+  }
+  MATCH (f)-[p:Purchased]->(l:Laptop)
+  WHERE NOT (u)-[:Purchased]->(l)
+  WITH l, sum(
+    weight * coalesce(p.count, 1) *
+    0.5 ^ (duration.inSeconds(coalesce(p.purchased_at, datetime()), datetime()).seconds / 86400.0 / $half_life_days)
+  ) AS score
+  RETURN l.id AS id, score
+  ORDER BY score DESC, id
+  LIMIT $limit
+}
+RETURN u.id AS user_id, id, score
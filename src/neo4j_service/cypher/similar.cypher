@@ -0,0 +1,16 @@
+// Laptops similar to the user's purchases plus laptops bought by similar users, both written by graph_analytics.py
+MATCH (u:User {id: $user_id})
+CALL {
+  WITH u
+  MATCH (u)-[:Purchased]->(:Laptop)-[s:SIMILAR_TO]->(l:Laptop)
+  RETURN l, s.score AS score
+  UNION ALL
+  WITH u
+  MATCH (u)-[s:SIMILAR_TO]->(:User)-[:Purchased]->(l:Laptop)
+  RETURN l, s.score AS score
+}
+WITH u, l, sum(score) AS score
+WHERE NOT (u)-[:Purchased]->(l)
+RETURN l.id AS id
+ORDER BY score DESC, id
+LIMIT $limit
@@ -0,0 +1,6 @@
+// Users whose stored candidates predate the last $max_age seconds, so their recency decay has drifted
+MATCH (u:User)
+WHERE u.candidates_updated < datetime() - duration({seconds: $max_age})
+RETURN u.id AS id
+ORDER BY u.candidates_updated
+LIMIT $limit
@@ -0,0 +1,11 @@
+// Replace each user's precomputed candidate list; touching the user first serializes concurrent refreshes
+UNWIND $users AS entry
+MATCH (u:User {id: entry.user_id})
+SET u.candidates_updated = datetime()
+WITH u, entry
+OPTIONAL MATCH (u)-[old:CANDIDATE]->(:Laptop)
+DELETE old
+WITH DISTINCT u, entry
+UNWIND entry.candidates AS candidate
+MATCH (l:Laptop {id: candidate.id})
+CREATE (u)-[:CANDIDATE {score: candidate.score}]->(l)
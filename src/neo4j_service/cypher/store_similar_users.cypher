@@ -0,0 +1,9 @@
+// Replace each source's SIMILAR_TO edges with the latest top-N from the analytics job
+UNWIND $rows AS row
+MATCH (a:User {id: row.id})
+OPTIONAL MATCH (a)-[old:SIMILAR_TO]->(:User)
+DELETE old
+WITH DISTINCT a, row
+UNWIND row.similar AS similar
+MATCH (b:User {id: similar.id})
+CREATE (a)-[:SIMILAR_TO {score: similar.score}]->(b)
@@ -0,0 +1,115 @@
+from pathlib import Path
+from scipy import sparse
+import numpy as np
+import logging
+import time
+
+from neo4j_connection import NEO4J_CONNECTION
+
+class GRAPH_ANALYTICS:
+    _BASE_DIR = Path(__file__).resolve().parent
+    _QUERIES_DIR = "cypher"
+    _OPS = {
+        "ExportPurchases": _BASE_DIR / _QUERIES_DIR / "export_purchases.cypher",
+        "StoreSimilarLaptops": _BASE_DIR / _QUERIES_DIR / "store_similar_laptops.cypher",
+        "StoreSimilarUsers": _BASE_DIR / _QUERIES_DIR / "store_similar_users.cypher"
+    }
+    ANALYTICS_PARAMS = {
+        "top_n": 20, # SIMILAR_TO edges kept per laptop and per user
+        "interval": 3600, # Seconds between runs
+        "write_batch": 500, # Source nodes per write transaction
+        "fetch_size": 10000 # Records pulled per round trip during export
+    }
+
+    def __init__(self):
+        self.neo4j = NEO4J_CONNECTION(fetch_size=self.ANALYTICS_PARAMS["fetch_size"])
+        self._queries = {op: self._fetch_query(op) for op in self._OPS}
+
+    def _fetch_query(self, op: str) -> str:
+        if op not in self._OPS:
+            raise KeyError(f"Operation '{op}' not found in available queries.")
+
+        with open(self._OPS[op], 'r') as file:
+            return file.read()
+
+    def _purchase_matrix(self) -> tuple:
+        # Binary users x laptops matrix; repeat purchases of a laptop count once
+        users, laptops = [], []
+        for record in self.neo4j.stream(self._queries["ExportPurchases"], {}):
+            users.append(record["user_id"])
+            laptops.append(record["laptop_id"])
+
+        user_ids, rows = np.unique(np.array(users, dtype=np.int64), return_inverse=True)
+        laptop_ids, cols = np.unique(np.array(laptops, dtype=np.int64), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(user_ids), len(laptop_ids))
+        )
+        matrix.data[:] = 1.0 # Duplicate entries were summed on construction
+        return matrix, user_ids, laptop_ids
+
+    @staticmethod
+    def laptop_similarity(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        # Cosine similarity of laptop purchase vectors: co-purchases / sqrt(buyers_a * buyers_b)
+        co_purchases = (matrix.T @ matrix).tocsr()
+        norm = sparse.diags(1.0 / np.sqrt(np.asarray(matrix.sum(axis=0)).ravel()))
+        return (norm @ co_purchases @ norm).tocsr()
+
+    @staticmethod
+    def user_similarity(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        # Jaccard similarity of purchase sets: |A & B| / (|A| + |B| - |A & B|)
+        shared = (matrix @ matrix.T).tocoo()
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        jaccard = shared.data / (sizes[shared.row] + sizes[shared.col] - shared.data)
+        return sparse.csr_matrix((jaccard, (shared.row, shared.col)), shape=shared.shape)
+
+    @staticmethod
+    def top_n(similarity: sparse.csr_matrix, ids: np.ndarray, n: int) -> list:
+        similarity = similarity.tolil()
+        similarity.setdiag(0)
+        similarity = similarity.tocsr()
+        similarity.eliminate_zeros()
+
+        rows = []
+        for i in range(similarity.shape[0]): # Every source is listed so stale edges are cleared
+            start, end = similarity.indptr[i], similarity.indptr[i + 1]
+            scores, cols = similarity.data[start:end], similarity.indices[start:end]
+            best = np.argsort(-scores, kind="stable")[:n]
+            rows.append({
+                "id": int(ids[i]),
+                "similar": [{"id": int(ids[c]), "score": float(s)} for c, s in zip(cols[best], scores[best])]
+            })
+        return rows
+
+    def _store(self, op: str, rows: list):
+        batch = self.ANALYTICS_PARAMS["write_batch"]
+        for i in range(0, len(rows), batch):
+            self.neo4j.execute_write(self._queries[op], {"rows": rows[i:i + batch]})
+
+    def run(self) -> dict:
+        matrix, user_ids, laptop_ids = self._purchase_matrix()
+        if matrix.nnz == 0:
+            return {"laptops": 0, "users": 0}
+
+        n = self.ANALYTICS_PARAMS["top_n"]
+        laptops = self.top_n(self.laptop_similarity(matrix), laptop_ids, n)
+        users = self.top_n(self.user_similarity(matrix), user_ids, n)
+
+        self._store("StoreSimilarLaptops", laptops)
+        self._store("StoreSimilarUsers", users)
+        return {"laptops": len(laptops), "users": len(users)}
+
+    def run_forever(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                result = self.run()
+                logging.info(f"Graph analytics updated {result} in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                logging.error(f"Graph analytics run failed: {e}")
+            time.sleep(self.ANALYTICS_PARAMS["interval"])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    GRAPH_ANALYTICS().run_forever()
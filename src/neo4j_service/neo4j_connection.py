@@ -1,13 +1,50 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, READ_ACCESS, WRITE_ACCESS
 
 class NEO4J_CONNECTION:
     NEO4J_PARAMS = {
         "uri": "bolt://localhost:7687",
         "auth": ("neo4j", "password"),
     }
+    POOL_PARAMS = {
+        "max_connection_pool_size": 50,
+        "connection_acquisition_timeout": 30 # Seconds to wait for a free connection
+    }
+    SESSION_PARAMS = {
+        "database": "neo4j", # Naming the database skips home database resolution per session
+        "fetch_size": 1000 # Records pulled per round trip when streaming
+    }
+
+    def __init__(self, max_connection_pool_size: int = None, fetch_size: int = None):
+        self.pool_params = dict(self.POOL_PARAMS)
+        if max_connection_pool_size is not None:
+            self.pool_params["max_connection_pool_size"] = max_connection_pool_size
+        self.session_params = dict(self.SESSION_PARAMS)
+        if fetch_size is not None:
+            self.session_params["fetch_size"] = fetch_size
 
-    def __init__(self):
         self.client = self.connect()
 
     def connect(self) -> GraphDatabase.driver:
-        return GraphDatabase.driver(**self.NEO4J_PARAMS)
\ No newline at end of file
+        return GraphDatabase.driver(**self.NEO4J_PARAMS, **self.pool_params)
+
+    def session(self, access_mode: str):
+        # Sessions share the driver's bookmark manager, so reads routed to followers still see earlier writes
+        return self.client.session(
+            default_access_mode=access_mode,
+            bookmark_manager=self.client.execute_query_bookmark_manager,
+            **self.session_params
+        )
+
+    def execute_read(self, query: str, params: dict) -> list:
+        with self.session(READ_ACCESS) as session:
+            return session.execute_read(lambda tx: tx.run(query, params).data())
+
+    def execute_write(self, query: str, params: dict) -> list:
+        with self.session(WRITE_ACCESS) as session:
+            return session.execute_write(lambda tx: tx.run(query, params).data())
+
+    def stream(self, query: str, params: dict):
+        # Records are pulled fetch_size at a time as the caller iterates; managed retries cannot replay a partial stream
+        with self.session(READ_ACCESS) as session:
+            with session.begin_transaction() as tx:
+                yield from tx.run(query, params)
@@ -1,5 +1,8 @@
 from pathlib import Path
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import threading
+import logging
+import time
 import uuid
 import json
 
@@ -11,12 +14,36 @@ class NEO4J_SERVICE:
     _OPS = {
         "Follow": _BASE_DIR / _QUERIES_DIR / "follow.cypher",
         "Purchase": _BASE_DIR / _QUERIES_DIR / "purchase.cypher",
-        "GetRecommendation": _BASE_DIR / _QUERIES_DIR / "recommend.cypher"
+        "PurchaseBatch": _BASE_DIR / _QUERIES_DIR / "purchase_batch.cypher",
+        "GetRecommendation": _BASE_DIR / _QUERIES_DIR / "recommend.cypher",
+        "GetCandidates": _BASE_DIR / _QUERIES_DIR / "candidates.cypher",
+        "StoreCandidates": _BASE_DIR / _QUERIES_DIR / "store_candidates.cypher",
+        "GetDependents": _BASE_DIR / _QUERIES_DIR / "dependents.cypher",
+        "GetStaleCandidates": _BASE_DIR / _QUERIES_DIR / "stale_candidates.cypher",
+        "ExportGraph": _BASE_DIR / _QUERIES_DIR / "export_graph.cypher",
+        "GetSimilar": _BASE_DIR / _QUERIES_DIR / "similar.cypher"
+    }
+    RECOMMEND_PARAMS = {
+        "limit": 10,
+        "candidates": 50, # Precomputed candidates kept per user
+        "second_degree_weight": 0.5,
+        "half_life_days": 30.0 # Purchase weight halves every this many days
+    }
+    RECOMMEND_MODES = ("precomputed", "live", "similar")
+    REFRESH_PARAMS = {
+        "interval": 0.5, # Seconds between refreshes for users whose graph changed
+        "max_age": 3600, # Seconds before a stored list is recomputed so purchase decay keeps advancing
+        "sweeps_per_max_age": 4, # Stale sweeps run every max_age / sweeps_per_max_age seconds
+        "batch": 200 # Users ranked per refresh query
     }
 
     def __init__(self):
-        connection = NEO4J_CONNECTION()
-        self.neo4j = connection.client
+        self.neo4j = NEO4J_CONNECTION()
+        self._queries = {op: self._fetch_query(op) for op in self._OPS} # Cypher text is read once at startup
+
+        self._refresh_lock = threading.Lock()
+        self._pending_changes = set() # Users whose purchases or follows changed since the last refresh
+        threading.Thread(target=self._refresh_loop, name="neo4j-candidate-refresh", daemon=True).start()
 
     def _fetch_query(self, op: str) -> str:
         if op not in self._OPS:
@@ -27,24 +54,118 @@ class NEO4J_SERVICE:
 
     def follow(self, user_id_from: int, user_id_to: int):
         params = {"user_id_from": user_id_from, "user_id_to": user_id_to}
-        query = self._fetch_query("Follow")
-        self.neo4j.execute_query(query, params)
+        self.neo4j.execute_write(self._queries["Follow"], params)
 
+        self._queue_refresh(user_id_from)
         return True
     
     def purchase(self, user_id: int, product_id: int):
         params = {"user_id": user_id, "product_id": product_id}
-        query = self._fetch_query("Purchase")
-        self.neo4j.execute_query(query, params)
+        self.neo4j.execute_write(self._queries["Purchase"], params)
 
+        self._queue_refresh(user_id)
         return True
 
-    def recommend(self, user_id: int):
-        params = {"user_id": user_id}
-        query = self._fetch_query("GetRecommendation")
-        result = self.neo4j.execute_query(query, params)
-        
-        return [record['id'] for record in result.records]
+    def purchase_batch(self, user_id: int, product_ids: list):
+        # The whole cart is one UNWIND write, followed by a single queued candidate refresh
+        params = {"user_id": user_id, "product_ids": list(dict.fromkeys(product_ids))}
+        result = self.neo4j.execute_write(self._queries["PurchaseBatch"], params)
+
+        self._queue_refresh(user_id)
+        return result[0]['purchased']
+
+    def _rank(self, user_ids: list, limit: int) -> dict:
+        params = {
+            "user_ids": user_ids,
+            "limit": limit,
+            "second_degree_weight": self.RECOMMEND_PARAMS["second_degree_weight"],
+            "half_life_days": self.RECOMMEND_PARAMS["half_life_days"]
+        }
+        ranked = {user_id: [] for user_id in user_ids}
+        for record in self.neo4j.stream(self._queries["GetRecommendation"], params): # Rows arrive best first per user
+            ranked[record['user_id']].append({"id": record['id'], "score": record['score']})
+        return ranked
+
+    def refresh_candidates(self, user_ids: list) -> dict:
+        ranked = self._rank(user_ids, self.RECOMMEND_PARAMS["candidates"])
+        params = {"users": [{"user_id": k, "candidates": v} for k, v in ranked.items()]}
+        self.neo4j.execute_write(self._queries["StoreCandidates"], params)
+
+        return ranked
+
+    def _queue_refresh(self, user_id: int):
+        with self._refresh_lock:
+            self._pending_changes.add(user_id)
+
+    def flush_refreshes(self) -> int:
+        # Re-rank the dependents of users whose purchases or follows changed
+        with self._refresh_lock:
+            changed, self._pending_changes = list(self._pending_changes), set()
+        if not changed:
+            return 0
+
+        try: # Only users within two follow hops score the changed users' purchases and follows
+            result = self.neo4j.execute_read(self._queries["GetDependents"], {"user_ids": changed})
+            user_ids = [record['id'] for record in result]
+
+            batch = self.REFRESH_PARAMS["batch"]
+            for i in range(0, len(user_ids), batch):
+                self.refresh_candidates(user_ids[i:i + batch])
+        except Exception:
+            with self._refresh_lock: # Retry on the next flush
+                self._pending_changes.update(changed)
+            raise
+        return len(user_ids)
+
+    def refresh_stale(self) -> int:
+        # Recompute lists old enough that their decayed scores have drifted; refreshed users drop out of the range scan
+        params = {"max_age": self.REFRESH_PARAMS["max_age"], "limit": self.REFRESH_PARAMS["batch"]}
+        refreshed = 0
+        while True:
+            user_ids = [record['id'] for record in self.neo4j.execute_read(self._queries["GetStaleCandidates"], params)]
+            if user_ids:
+                self.refresh_candidates(user_ids)
+                refreshed += len(user_ids)
+            if len(user_ids) < params["limit"]:
+                return refreshed
+
+    def _refresh_loop(self):
+        sweep_interval = self.REFRESH_PARAMS["max_age"] / self.REFRESH_PARAMS["sweeps_per_max_age"]
+        next_sweep = time.monotonic() + sweep_interval
+        while True:
+            time.sleep(self.REFRESH_PARAMS["interval"])
+            try:
+                self.flush_refreshes()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + sweep_interval
+                    self.refresh_stale()
+            except Exception as e:
+                logging.error(f"Candidate refresh failed: {e}")
+
+    def recommend(self, user_id: int, limit: int = None, mode: str = "precomputed"):
+        limit = limit or self.RECOMMEND_PARAMS["limit"]
+        if mode not in self.RECOMMEND_MODES:
+            raise ValueError(f"Unknown recommendation mode '{mode}'")
+
+        if mode == "live":
+            return [x["id"] for x in self._rank([user_id], limit)[user_id]]
+
+        if mode == "similar": # SIMILAR_TO edges are maintained by graph_analytics.py
+            result = self.neo4j.execute_read(self._queries["GetSimilar"], {"user_id": user_id, "limit": limit})
+            return [record['id'] for record in result]
+
+        params = {"user_id": user_id, "limit": limit}
+        result = self.neo4j.execute_read(self._queries["GetCandidates"], params)
+        if result and result[0]['computed']:
+            return result[0]['ids']
+
+        # First request for this user; compute and keep the list for later reads
+        ranked = self.refresh_candidates([user_id])[user_id]
+        return [x["id"] for x in ranked[:limit]]
+
+    def export_graph(self):
+        for record in self.neo4j.stream(self._queries["ExportGraph"], {}):
+            yield record.data()
 
 app = Flask(__name__)
 neo4j_service = NEO4J_SERVICE()
@@ -83,21 +204,58 @@ def user_purchase():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
+@app.route('/user/purchase_batch', methods=['POST'])
+def user_purchase_batch():
+    try:
+        params = request.json if request.is_json else {}
+        user_id = params.get('user_id')
+        product_ids = params.get('product_ids')
+
+        if user_id is None or not isinstance(product_ids, list):
+            raise ValueError("Purchase batch requires 'user_id' and a list of 'product_ids'")
+
+        result = neo4j_service.purchase_batch(user_id, product_ids)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
 @app.route('/user/recommend', methods=['GET'])
 def user_recommend():
     try:
         user_id = request.args.get('user_id', type=int)
+        limit = request.args.get('limit', type=int)
+        mode = request.args.get('mode', default='precomputed')
 
         if user_id is None:
             raise ValueError("Recommend requires 'user_id' parameter")
+        if limit is not None and limit <= 0:
+            raise ValueError("'limit' must be a positive integer")
 
-        result = neo4j_service.recommend(user_id)
+        result = neo4j_service.recommend(user_id, limit, mode)
         return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/user/recommend/refresh', methods=['POST'])
+def user_recommend_refresh():
+    try:
+        result = neo4j_service.flush_refreshes() + neo4j_service.refresh_stale()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/graph/export', methods=['GET'])
+def graph_export():
+    try:
+        lines = (app.json.dumps(edge) + "\n" for edge in neo4j_service.export_graph())
+        return Response(lines, mimetype="application/x-ndjson"), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/')
 def health_check():
     return jsonify({"status": "running", "message": "NEO4J Service is active"}), 200
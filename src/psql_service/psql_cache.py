@@ -0,0 +1,51 @@
+from collections import OrderedDict
+import threading
+import time
+
+class PSQL_CACHE:
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries = OrderedDict() # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self._stats["misses"] += 1
+            return default
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key, value, generation: int):
+        with self._lock:
+            if generation != self._generation: # Value was computed before the last invalidation
+                return
+
+            expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl)
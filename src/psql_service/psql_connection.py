@@ -1,4 +1,16 @@
+from contextlib import contextmanager
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+import threading
 import psycopg2
+import select
+import time
+import uuid
+
+class PSQL_PREPARING_CONNECTION(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set() # Prepared statements live exactly as long as this server session
 
 class PSQL_CONNECTION:
     PSQL_PARAMS = {
@@ -7,20 +19,166 @@ class PSQL_CONNECTION:
         "user": "admin",
         "password": "password"
     }
+    POOL_PARAMS = {
+        "minconn": 2,
+        "maxconn": 10,
+        "timeout": 30 # Seconds to wait for a free connection
+    }
+
+    def __init__(self, minconn: int = None, maxconn: int = None, timeout: float = None):
+        self.minconn = minconn if minconn is not None else self.POOL_PARAMS["minconn"]
+        self.maxconn = maxconn if maxconn is not None else self.POOL_PARAMS["maxconn"]
+        self.timeout = timeout if timeout is not None else self.POOL_PARAMS["timeout"]
 
-    def __init__(self):
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._stats = {"in_use": 0, "waiting": 0, "checkouts": 0, "reconnects": 0, "checkout_time": 0.0, "max_checkout_time": 0.0}
         self.connect()
 
     def connect(self):
-        self.psql = psycopg2.connect(**self.PSQL_PARAMS)
-        self.psql.autocommit = True
+        self.pool = ThreadedConnectionPool(
+            self.minconn, self.maxconn, connection_factory=PSQL_PREPARING_CONNECTION, **self.PSQL_PARAMS
+        )
+        # putconn closes returned connections once minconn are idle; after the initial connections are open,
+        # keep up to maxconn idle so busy periods reuse sessions and their prepared statements
+        self.pool.minconn = self.maxconn
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, minconn=self.minconn, maxconn=self.maxconn)
+        stats["avg_checkout_time"] = stats["checkout_time"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def _is_alive(self, conn) -> bool:
+        if conn.closed != 0:
+            return False
+        return conn.get_transaction_status() != extensions.TRANSACTION_STATUS_UNKNOWN
+
+    def _discard(self, conn):
+        self.pool.putconn(conn, close=True)
+        with self._lock:
+            self._stats["reconnects"] += 1
+
+    def _checkout(self):
+        started = time.perf_counter()
+        with self._lock:
+            self._stats["waiting"] += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self._stats["waiting"] -= 1
+        if not acquired:
+            raise ConnectionError(f"No database connection available within {self.timeout}s.")
+
+        try:
+            conn = self.pool.getconn()
+            if not self._is_alive(conn): # Replace connections the server has dropped
+                self._discard(conn)
+                conn = self.pool.getconn()
+            conn.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["checkouts"] += 1
+            self._stats["checkout_time"] += elapsed
+            self._stats["max_checkout_time"] = max(self._stats["max_checkout_time"], elapsed)
+        return conn
+
+    def _checkin(self, conn, broken: bool = False):
+        try:
+            if broken or not self._is_alive(conn):
+                self._discard(conn)
+            else:
+                self.pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, broken)
+
+    def _retry(self, operation):
+        # A pooled connection can die between the liveness check and use; retry once on a fresh one
+        try:
+            with self.connection() as conn:
+                return operation(conn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            with self.connection() as conn:
+                return operation(conn)
 
     def execute_query(self, query: str, params: dict) -> list:
-        if not self.psql:
-            raise ConnectionError("No active database connection.")
-        if self.psql.closed == 0: # Refresh connection if it was closed
-            self.connect()
-
-        with self.psql.cursor() as cur:
-            cur.execute(query, params)
-            return cur.fetchall()
+        def operation(conn):
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+
+        return self._retry(operation)
+
+    def execute_prepared(self, name: str, query: str, params: list) -> list:
+        def operation(conn):
+            with conn.cursor() as cur:
+                if name not in conn.prepared:
+                    cur.execute(f"prepare {name} as {query}")
+                    conn.prepared.add(name)
+
+                if params:
+                    cur.execute(f"execute {name} ({', '.join(['%s'] * len(params))})", params)
+                else:
+                    cur.execute(f"execute {name}")
+                return cur.fetchall()
+
+        return self._retry(operation)
+
+    def stream_query(self, query: str, params: dict, itersize: int = 2000):
+        with self.connection() as conn:
+            # Named cursors need a transaction, which autocommit connections never open
+            conn.autocommit = False
+            try:
+                with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                    cur.itersize = itersize
+                    cur.execute(query, params)
+                    yield from cur
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+
+    def listen(self, channel: str, callback, poll_timeout: float = 5.0) -> threading.Thread:
+        # Deliver NOTIFY payloads on a dedicated connection; callback(None) means notifications may have been missed
+        def run():
+            while True:
+                conn = None
+                try:
+                    conn = psycopg2.connect(**self.PSQL_PARAMS)
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f"listen {channel}")
+                    callback(None)
+
+                    while True:
+                        if select.select([conn], [], [], poll_timeout) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            callback(conn.notifies.pop(0).payload)
+                except psycopg2.Error:
+                    if conn is not None:
+                        conn.close()
+                    time.sleep(poll_timeout)
+
+        thread = threading.Thread(target=run, name=f"psql-listen-{channel}", daemon=True)
+        thread.start()
+        return thread
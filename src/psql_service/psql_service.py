@@ -1,7 +1,17 @@
+from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
+import hashlib
+import secrets
+import bcrypt
+import hmac
+import json
 
 from psql_connection import PSQL_CONNECTION
-from flask import Flask, request, jsonify
+from psql_cache import PSQL_CACHE
+from flask import Flask, Response, request, jsonify
+
+QUERY_PLAN = namedtuple("QUERY_PLAN", ["query", "prepared", "params", "statement"])
 
 class PSQL_SERVICE:
     _BASE_DIR = Path(__file__).resolve().parent
@@ -10,89 +20,270 @@ class PSQL_SERVICE:
         "FetchProducts": _BASE_DIR / _QUERIES_DIR / "fetch_products.sql",
         "UserLogin": _BASE_DIR / _QUERIES_DIR / "user_login.sql",
         "GetUserId": _BASE_DIR / _QUERIES_DIR / "get_user_id.sql",
-        "IsAdmin": _BASE_DIR / _QUERIES_DIR / "is_admin.sql"
+        "IsAdmin": _BASE_DIR / _QUERIES_DIR / "is_admin.sql",
+        "AuthLogin": _BASE_DIR / _QUERIES_DIR / "auth_login.sql",
+        "RehashPassword": _BASE_DIR / _QUERIES_DIR / "rehash_password.sql",
+        "FetchFacets": _BASE_DIR / _QUERIES_DIR / "fetch_facets.sql",
+        "FetchProductsBatch": _BASE_DIR / _QUERIES_DIR / "fetch_products_batch.sql"
+    }
+
+    # Filter key -> (column or JSONB attribute expression, operator)
+    _FILTERS = {
+        "id": ("p.id", "eq"),
+        "id_in": ("p.id", "in"),
+        "vendor": ("v.vendor", "eq"),
+        "vendor_in": ("v.vendor", "in"),
+        "product_type": ("pt.product_type", "eq"),
+        "product_type_in": ("pt.product_type", "in"),
+        "product_condition": ("pc.product_condition", "eq"),
+        "product_condition_in": ("pc.product_condition", "in"),
+        "mpn": ("p.mpn", "eq"),
+        "mpn_in": ("p.mpn", "in"),
+        "product_warranty": ("p.product_warranty", "eq"),
+        "product_warranty_min": ("p.product_warranty", "min"),
+        "product_warranty_max": ("p.product_warranty", "max"),
+        "stock_quantity": ("p.stock_quantity", "eq"),
+        "stock_quantity_min": ("p.stock_quantity", "min"),
+        "stock_quantity_max": ("p.stock_quantity", "max"),
+        "price": ("p.price", "eq"),
+        "price_min": ("p.price", "min"),
+        "price_max": ("p.price", "max"),
+        "Disk Type": ("p.attributes->>'Disk Type'", "eq"),
+        "Disk Storage Size": ("p.attributes->>'Disk Storage Size'", "eq"),
+        "RAM Size": ("p.attributes->>'RAM Size'", "eq"),
+        "Screen Size": ("p.attributes->>'Screen Size'", "eq"),
+        "Operating system": ("p.attributes->>'Operating system'", "eq"),
+        "Processor Name": ("p.attributes->>'Processor Name'", "eq"),
+        "after_id": ("p.id", "after"),
+    }
+    # Columns callers can project in batch lookups, in fetch_products order
+    _PRODUCT_COLUMNS = {
+        "id": "p.id",
+        "vendor": "v.vendor",
+        "product_type": "pt.product_type",
+        "product_condition": "pc.product_condition",
+        "mpn": "p.mpn",
+        "product_warranty": "p.product_warranty",
+        "stock_quantity": "p.stock_quantity",
+        "price": "p.price",
+        "attributes": "p.attributes",
+        "created_at": "p.created_at",
+        "updated_at": "p.updated_at",
     }
+    # JSONB attributes parsed into typed columns, which support range filters
+    _TYPED_ATTRIBUTES = {
+        "RAM Size": "p.ram_size",
+        "Screen Size": "p.screen_size",
+        "Disk Storage Size": "p.disk_storage_size",
+    }
+    _FILTER_OPERATORS = {
+        "eq": "{column} = {param}",
+        "min": "{column} >= {param}",
+        "max": "{column} <= {param}",
+        "in": "{column} = any({param})",
+        "after": "{column} > {param}",
+    }
+
+    # Prepare each fetch_products query shape on the server once per connection
+    PREPARE_STATEMENTS = True
+    # Rows fetched per round trip when streaming from a server-side cursor
+    STREAM_ITERSIZE = 2000
+    # Results kept per normalized filter until they expire or the catalog changes
+    PRODUCT_CACHE_PARAMS = {"maxsize": 4096, "ttl": 300}
+    FACET_CACHE_PARAMS = {"maxsize": 1024, "ttl": 300}
+    # Verified logins are remembered briefly so repeated logins skip the bcrypt check
+    LOGIN_CACHE_PARAMS = {"maxsize": 1024, "ttl": 30}
+    # bcrypt cost for password hashes; weaker hashes are upgraded on the next successful login
+    PASSWORD_HASH_COST = 8
+    # pgcrypto's crypt() only reads the 2a variant, so hashes written here stay valid for hash_password users
+    PASSWORD_HASH_PREFIX = b"2a"
 
     def __init__(self):
         self.psql = PSQL_CONNECTION()
+        self._queries = {op: path.read_text() for op, path in self._OPS.items()}
+
+        self.product_cache = PSQL_CACHE(**self.PRODUCT_CACHE_PARAMS)
+        self.facet_cache = PSQL_CACHE(**self.FACET_CACHE_PARAMS)
+        self.login_cache = PSQL_CACHE(**self.LOGIN_CACHE_PARAMS)
+        self._login_cache_key = secrets.token_bytes(32)
+        # Checked against when the user does not exist, so a miss costs as much as a wrong password
+        self._dummy_hash = self._hash_password(secrets.token_hex(16)).decode()
+        self.psql.listen("products_changed", self._products_changed)
 
     def _fetch_query(self, op: str) -> str:
-        if op not in self._OPS:
+        if op not in self._queries:
             raise KeyError(f"Operation '{op}' not found in available queries.")
-        
-        with open(self._OPS[op], 'r') as file:
-            return file.read()
-
-    def fetch_products(self, filter: dict = {}) -> list:
-        query = self._fetch_query("FetchProducts")
-        params = {}
-
-        for key in filter.keys():
-            match (key):
-                case "id":
-                    query += f"\nAND p.id = %(id)s"
-                    params['id'] = filter['id']
-                case "vendor":
-                    query += f"\nAND v.vendor = %(vendor)s"
-                    params['vendor'] = filter['vendor']
-                case "product_type":
-                    query += f"\nAND pt.product_type = %(product_type)s"
-                    params['product_type'] = filter['product_type']
-                case "product_condition":
-                    query += f"\nAND pc.product_condition = %(product_condition)s"
-                    params['product_condition'] = filter['product_condition']
-                case "mpn":
-                    query += f"\nAND p.mpn = %(mpn)s"
-                    params['mpn'] = filter['mpn']
-                case "product_warranty":
-                    query += f"\nAND p.product_warranty = %(product_warranty)s"
-                    params['product_warranty'] = filter['product_warranty']
-                case "product_warranty_min":
-                    query += f"\nAND p.product_warranty >= %(product_warranty_min)s"
-                    params['product_warranty_min'] = filter['product_warranty_min']
-                case "product_warranty_max":
-                    query += f"\nAND p.product_warranty <= %(product_warranty_max)s"
-                    params['product_warranty_max'] = filter['product_warranty_max']
-                case "stock_quantity":
-                    query += f"\nAND p.stock_quantity = %(stock_quantity)s"
-                    params['stock_quantity'] = filter['stock_quantity']
-                case "stock_quantity_min":
-                    query += f"\nAND p.stock_quantity >= %(stock_quantity_min)s"
-                    params['stock_quantity_min'] = filter['stock_quantity_min']
-                case "stock_quantity_max":
-                    query += f"\nAND p.stock_quantity <= %(stock_quantity_max)s"
-                    params['stock_quantity_max'] = filter['stock_quantity_max']
-                case "price":
-                    query += f"\nAND p.price = %(price)s"
-                    params['price'] = filter['price']
-                case "price_min":
-                    query += f"\nAND p.price >= %(price_min)s"
-                    params['price_min'] = filter['price_min']
-                case "price_max":
-                    query += f"\nAND p.price <= %(price_max)s"
-                    params['price_max'] = filter['price_max']
-                case "Disk Type":
-                    query += f"\nAND p.attributes->>'Disk Type' = %(Disk Type)s"
-                    params['Disk Type'] = filter['Disk Type']
-                case "Disk Storage Size":
-                    query += f"\nAND p.attributes->>'Disk Storage Size' = %(Disk Storage Size)s"
-                    params['Disk Storage Size'] = filter['Disk Storage Size']
-                case "RAM Size":
-                    query += f"\nAND p.attributes->>'RAM Size' = %(RAM Size)s"
-                    params['RAM Size'] = filter['RAM Size']
-                case "Screen Size":
-                    query += f"\nAND p.attributes->>'Screen Size' = %(Screen Size)s"
-                    params['Screen Size'] = filter['Screen Size']
-                case "Operating system":
-                    query += f"\nAND p.attributes->>'Operating system' = %(Operating system)s"
-                    params['Operating system'] = filter['Operating system']
-                case "Processor Name":
-                    query += f"\nAND p.attributes->>'Processor Name' = %(Processor Name)s"
-                    params['Processor Name'] = filter['Processor Name']
-            
-        query = query.replace("AND", "WHERE", 1)
-        return self.psql.execute_query(query, params)
-    
+
+        return self._queries[op]
+
+    def fetch_products(self, filter: dict = {}, limit: int | None = None) -> list:
+        signature = self._signature(filter, limit)
+        if (result := self.product_cache.get(signature)) is not None:
+            return result
+
+        generation = self.product_cache.generation()
+        shape, params = self._bind_filter(filter)
+        plan = self._plan_fetch_products(shape, limit is not None)
+        result = self._execute_plan(plan, dict(params, limit=limit))
+
+        self.product_cache.put(signature, result, generation)
+        return result
+
+    def stream_products(self, filter: dict = {}, limit: int | None = None):
+        shape, params = self._bind_filter(filter)
+        plan = self._plan_fetch_products(shape, limit is not None)
+        return self.psql.stream_query(plan.query, dict(params, limit=limit), self.STREAM_ITERSIZE)
+
+    def fetch_facets(self, filter: dict = {}) -> dict:
+        signature = self._signature(filter)
+        if (facets := self.facet_cache.get(signature)) is not None:
+            return facets
+
+        generation = self.facet_cache.generation()
+        shape, params = self._bind_filter(filter)
+        plan = self._plan_facets(shape)
+        facets = {}
+        for name, value, count in self._execute_plan(plan, params):
+            if value is not None:
+                facets.setdefault(name, {})[value] = count
+
+        self.facet_cache.put(signature, facets, generation)
+        return facets
+
+    def fetch_products_batch(self, ids: list, columns: list | None = None) -> list:
+        columns = tuple(columns or self._PRODUCT_COLUMNS.keys())
+        plan = self._plan_batch(columns)
+        rows = self._execute_plan(plan, {"ids": ids})
+        return [dict(zip(columns, row)) for row in rows]
+
+    def cache_stats(self) -> dict:
+        return {"products": self.product_cache.stats(), "facets": self.facet_cache.stats(), "logins": self.login_cache.stats()}
+
+    @staticmethod
+    def _signature(filter: dict, *extra) -> str:
+        return json.dumps([filter, *extra], sort_keys=True, default=str)
+
+    def invalidate_caches(self):
+        self.product_cache.invalidate()
+        self.facet_cache.invalidate()
+        self.login_cache.invalidate()
+
+    def _products_changed(self, payload: str | None):
+        # Any write to products (including stock changes) or a lost LISTEN connection drops cached results
+        self.product_cache.invalidate()
+        self.facet_cache.invalidate()
+
+    def _execute_plan(self, plan: QUERY_PLAN, params: dict) -> list:
+        if self.PREPARE_STATEMENTS:
+            return self.psql.execute_prepared(plan.statement, plan.prepared, [params[key] for key in plan.params])
+
+        return self.psql.execute_query(plan.query, params)
+
+    @lru_cache(maxsize=128)
+    def _plan_fetch_products(self, shape: tuple, paginated: bool = False) -> QUERY_PLAN:
+        if paginated:
+            return self._plan("FetchProducts", shape, "order by p.id\nlimit {limit}", ("limit",))
+        return self._plan("FetchProducts", shape, "order by p.id")
+
+    @lru_cache(maxsize=128)
+    def _plan_facets(self, shape: tuple) -> QUERY_PLAN:
+        return self._plan("FetchFacets", shape, "group by facet.name, facet.value")
+
+    @lru_cache(maxsize=128)
+    def _plan_batch(self, columns: tuple) -> QUERY_PLAN:
+        for column in columns:
+            if column not in self._PRODUCT_COLUMNS:
+                raise KeyError(f"Unknown product column '{column}'.")
+
+        query = self._fetch_query("FetchProductsBatch")
+        select = ", ".join(self._PRODUCT_COLUMNS[column] for column in columns)
+        return QUERY_PLAN(
+            query=query.format(columns=select, ids="%(ids)s"),
+            prepared=query.format(columns=select, ids="$1"),
+            params=("ids",),
+            statement="fetchproductsbatch_" + hashlib.sha1(repr(columns).encode()).hexdigest()[:16]
+        )
+
+    def _bind_filter(self, filter: dict) -> tuple:
+        # Split a filter into a hashable query shape and the parameters it binds
+        shape, params = [], {}
+        for key in sorted(filter.keys()):
+            if key != "attributes":
+                shape.append(key)
+                params[key] = filter[key]
+                continue
+
+            if not isinstance(filter[key], dict):
+                raise ValueError("'attributes' must be a dictionary of attribute filters")
+
+            for index, name in enumerate(sorted(filter[key].keys())):
+                value = filter[key][name]
+                if isinstance(value, dict):
+                    if name not in self._TYPED_ATTRIBUTES:
+                        raise KeyError(f"Attribute '{name}' does not support range filters.")
+
+                    for bound in sorted(value.keys()):
+                        if bound not in ("min", "max"):
+                            raise KeyError(f"Unknown range bound '{bound}' for attribute '{name}'.")
+                        param = f"attribute_{index}_{bound}"
+                        shape.append(("range", self._TYPED_ATTRIBUTES[name], bound, param))
+                        params[param] = value[bound]
+                else:
+                    values = value if isinstance(value, list) else [value]
+                    if not values:
+                        raise ValueError(f"Attribute '{name}' needs at least one value")
+
+                    prefix = f"attribute_{index}"
+                    shape.append(("contains", prefix, len(values)))
+                    for position, item in enumerate(values):
+                        params[f"{prefix}_{position}"] = json.dumps({name: item})
+
+        return tuple(shape), params
+
+    def _plan(self, op: str, shape: tuple, tail: str, tail_params: tuple = ()) -> QUERY_PLAN:
+        conditions, prepared_conditions, params = [], [], []
+
+        def bind(param: str) -> tuple:
+            params.append(param)
+            return f"%({param})s", f"${len(params)}"
+
+        for element in shape:
+            if isinstance(element, str):
+                if element not in self._FILTERS:
+                    raise KeyError(f"Unknown filter '{element}'.")
+
+                column, operator = self._FILTERS[element]
+                param, prepared_param = bind(element)
+                conditions.append(self._FILTER_OPERATORS[operator].format(column=column, param=param))
+                prepared_conditions.append(self._FILTER_OPERATORS[operator].format(column=column, param=prepared_param))
+            elif element[0] == "range":
+                _, column, bound, name = element
+                param, prepared_param = bind(name)
+                conditions.append(self._FILTER_OPERATORS[bound].format(column=column, param=param))
+                prepared_conditions.append(self._FILTER_OPERATORS[bound].format(column=column, param=prepared_param))
+            else:
+                # Any-of containment tests, each answered by the jsonb_path_ops GIN index
+                _, prefix, count = element
+                bound = [bind(f"{prefix}_{position}") for position in range(count)]
+                conditions.append("(" + " or ".join(f"p.attributes @> {param}::jsonb" for param, _ in bound) + ")")
+                prepared_conditions.append("(" + " or ".join(f"p.attributes @> {param}::jsonb" for _, param in bound) + ")")
+
+        tail_bound = {key: bind(key) for key in tail_params}
+        query = self._fetch_query(op)
+        statement = op.lower() + "_" + hashlib.sha1(repr(shape + tail_params).encode()).hexdigest()[:16]
+        return QUERY_PLAN(
+            query=query + self._where(conditions) + "\n" + tail.format(**{key: param for key, (param, _) in tail_bound.items()}),
+            prepared=query + self._where(prepared_conditions) + "\n" + tail.format(**{key: param for key, (_, param) in tail_bound.items()}),
+            params=tuple(params),
+            statement=statement
+        )
+
+    @staticmethod
+    def _where(conditions: list) -> str:
+        if not conditions:
+            return ""
+        return "\nwhere " + "\nand ".join(conditions)
+
     def user_login(self, user_name: str, user_password: str) -> bool:
         query = self._fetch_query("UserLogin")
         params = {'user_name': user_name, 'user_password': user_password}
@@ -102,6 +293,51 @@ class PSQL_SERVICE:
         else:
             return result[0][0]
     
+    def auth_login(self, user_name: str, user_password: str) -> dict:
+        # Cache key is keyed with a per-process secret so plaintext passwords are never held in memory
+        signature = hmac.new(self._login_cache_key, f"{user_name}\0{user_password}".encode(), hashlib.sha256).hexdigest()
+        if (principal := self.login_cache.get(signature)) is not None:
+            return principal
+
+        generation = self.login_cache.generation()
+        # Only the stored hash leaves the database; the password itself is never part of a statement
+        query = self._fetch_query("AuthLogin")
+        result = self.psql.execute_query(query, {'user_name': user_name})
+        if not len(result):
+            self._verify_password(user_password, self._dummy_hash)
+            return {"verified": False, "user_id": None, "admin": False}
+
+        user_id, admin, password_hash = result[0]
+        if not self._verify_password(user_password, password_hash):
+            return {"verified": False, "user_id": None, "admin": False}
+
+        if self._hash_cost(password_hash) < self.PASSWORD_HASH_COST:
+            query = self._fetch_query("RehashPassword")
+            params = {'user_name': user_name, 'old_hash': password_hash, 'new_hash': self._hash_password(user_password).decode()}
+            self.psql.execute_query(query, params)
+
+        principal = {"verified": True, "user_id": user_id, "admin": bool(admin)}
+        self.login_cache.put(signature, principal, generation)
+        return principal
+
+    def _hash_password(self, password: str) -> bytes:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.PASSWORD_HASH_COST, self.PASSWORD_HASH_PREFIX))
+
+    def _verify_password(self, password: str, password_hash: str) -> bool:
+        if self._hash_cost(password_hash) == 0: # Legacy plaintext rows; rehashed once they verify
+            self._verify_password(password, self._dummy_hash)
+            return hmac.compare_digest(password.encode(), password_hash.encode())
+        try:
+            return bcrypt.checkpw(password.encode(), password_hash.encode())
+        except ValueError: # Malformed stored hash
+            return False
+
+    @staticmethod
+    def _hash_cost(password_hash: str) -> int:
+        # bcrypt hashes look like $2a$08$<salt><hash>
+        parts = password_hash.split("$")
+        return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else 0
+
     def get_user_id(self, user_name: str) -> str:
         query = self._fetch_query("GetUserId")
         params = {'user_name': user_name}
@@ -118,15 +354,60 @@ psql_service = PSQL_SERVICE()
 
 @app.route('/fetch_products', methods=['GET'])
 def fetch_products():
+    try:
+        params = dict(request.json) if request.is_json else {}
+        limit = params.pop('limit', None)
+        stream = params.pop('stream', False)
+
+        if limit is not None and (not isinstance(limit, int) or limit <= 0):
+            raise ValueError("'limit' must be a positive integer")
+
+        if stream:
+            rows = psql_service.stream_products(params, limit)
+            lines = (app.json.dumps(list(row)) + "\n" for row in rows)
+            return Response(lines, mimetype="application/x-ndjson"), 200
+
+        result = psql_service.fetch_products(params, limit)
+        response = {"status": "success", "data": result}
+        if limit is not None:
+            response["next_after_id"] = result[-1][0] if len(result) == limit else None
+
+        return jsonify(response), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+@app.route('/fetch_products/facets', methods=['GET'])
+def fetch_facets():
     try:
         params = request.json if request.is_json else {}
-        result = psql_service.fetch_products(params)
+        result = psql_service.fetch_facets(params)
         return jsonify({"status": "success", "data": result}), 200
-    except KeyError as e:
+    except (KeyError, ValueError) as e:
         return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
-    
+
+@app.route('/products/batch', methods=['POST'])
+def fetch_products_batch():
+    try:
+        params = request.json if request.is_json else {}
+        ids = params.get('ids')
+        columns = params.get('columns')
+
+        if not isinstance(ids, list) or not all(isinstance(x, int) for x in ids):
+            raise ValueError("'ids' must be a list of integers")
+        if columns is not None and not isinstance(columns, list):
+            raise ValueError("'columns' must be a list")
+
+        result = psql_service.fetch_products_batch(ids, columns)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/get_user_id', methods=['GET'])
 def get_user_id():
     try:
@@ -176,9 +457,50 @@ def user_login():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/auth/login', methods=['POST'])
+def auth_login():
+    try:
+        params = request.json if request.is_json else {}
+        user_name = params.get('user_name')
+        user_password = params.get('user_password')
+
+        if not user_name or not user_password:
+            raise ValueError("Both 'user_name' and 'user_password' are required.")
+
+        result = psql_service.auth_login(user_name, user_password)
+        return jsonify({"status": "success", "data": result}), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    try:
+        result = psql_service.psql.stats()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    try:
+        result = psql_service.cache_stats()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/cache_invalidate', methods=['POST'])
+def cache_invalidate():
+    try:
+        psql_service.invalidate_caches()
+        return jsonify({"status": "success", "data": True}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/')
 def health_check():
     return jsonify({"status": "running", "message": "PSQL Service is active"}), 200
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5001, debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,6 @@
+select
+    user_id,
+    admin,
+    user_password
+from users
+where user_name = %(user_name)s
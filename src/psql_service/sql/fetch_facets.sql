@@ -0,0 +1,21 @@
+select
+    facet.name,
+    facet.value,
+    count(*)
+from products p
+left join categories c on p.category_id = c.id
+left join vendors v on p.vendor_id = v.id
+left join product_types pt on p.product_type_id = pt.id
+left join product_conditions pc on p.product_condition_id = pc.id
+cross join lateral (values
+    ('vendor', v.vendor),
+    ('product_type', pt.product_type),
+    ('product_condition', pc.product_condition),
+    ('Processor Name', p.attributes->>'Processor Name'),
+    ('Graphics Card', p.attributes->>'Graphics Card'),
+    ('Screen Size', p.attributes->>'Screen Size'),
+    ('RAM Size', p.attributes->>'RAM Size'),
+    ('Disk Type', p.attributes->>'Disk Type'),
+    ('Disk Storage Size', p.attributes->>'Disk Storage Size'),
+    ('Operating system', p.attributes->>'Operating system')
+) as facet(name, value)
@@ -0,0 +1,8 @@
+select {columns}
+from products p
+left join categories c on p.category_id = c.id
+left join vendors v on p.vendor_id = v.id
+left join product_types pt on p.product_type_id = pt.id
+left join product_conditions pc on p.product_condition_id = pc.id
+where p.id = any({ids})
+order by p.id
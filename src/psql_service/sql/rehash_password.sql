@@ -0,0 +1,5 @@
+update users
+set user_password = %(new_hash)s
+where user_name = %(user_name)s
+and user_password = %(old_hash)s
+returning user_id
@@ -1,3 +1,3 @@
-select user_password = %(user_password)s
+select user_password = crypt(%(user_password)s, user_password)
 from users
-where user_name = %(user_name)s
\ No newline at end of file
+where user_name = %(user_name)s
@@ -0,0 +1,11 @@
+-- KEYS[1]: user hash, ARGV[1]: new session id, ARGV[2]: timeout, ARGV[3]: session data, ARGV[4]: new cart id
+local previous_session = redis.call('HGET', KEYS[1], 'session_id')
+if previous_session then
+    redis.call('DEL', 'session:' .. previous_session)
+end
+
+redis.call('SET', 'session:' .. ARGV[1], ARGV[3], 'EX', ARGV[2])
+redis.call('HSET', KEYS[1], 'session_id', ARGV[1])
+redis.call('HSETNX', KEYS[1], 'cart_id', ARGV[4])
+
+return {ARGV[1], redis.call('HGET', KEYS[1], 'cart_id'), previous_session}
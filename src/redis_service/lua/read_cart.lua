@@ -0,0 +1,7 @@
+-- KEYS[1]: user hash, KEYS[2]: cart hash, ARGV[1]: idle timeout
+if redis.call('HEXISTS', KEYS[1], 'cart_id') == 0 then
+    return {}
+end
+
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return redis.call('HGETALL', KEYS[2])
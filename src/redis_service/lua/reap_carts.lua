@@ -0,0 +1,11 @@
+-- KEYS: cart hashes to check; a cart is orphaned when its owner no longer points at it
+local reaped, reclaimed = 0, 0
+for _, cart_key in ipairs(KEYS) do
+    local user_id = string.sub(cart_key, 6)
+    if not string.match(user_id, '^%d+$') or redis.call('HEXISTS', 'user:' .. user_id, 'cart_id') == 0 then
+        reclaimed = reclaimed + (redis.call('MEMORY', 'USAGE', cart_key) or 0)
+        reaped = reaped + redis.call('UNLINK', cart_key)
+    end
+end
+
+return {reaped, reclaimed}
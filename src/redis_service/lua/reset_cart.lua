@@ -0,0 +1,5 @@
+-- KEYS[1]: user hash, KEYS[2]: cart hash, ARGV[1]: cart id
+redis.call('DEL', KEYS[2])
+redis.call('HSET', KEYS[1], 'cart_id', ARGV[1])
+
+return ARGV[1]
@@ -0,0 +1,15 @@
+-- KEYS: session keys, ARGV[1]: timeout for sessions stored without one
+-- Returns the timeout applied to each key, 0 where the session no longer exists
+local applied = {}
+for i, key in ipairs(KEYS) do
+    local timeout = 0
+    local session = redis.call('GET', key)
+    if session then
+        local ok, value = pcall(cjson.decode, session)
+        timeout = (ok and type(value) == 'table' and tonumber(value['timeout'])) or tonumber(ARGV[1])
+        redis.call('EXPIRE', key, timeout)
+    end
+    applied[i] = timeout
+end
+
+return applied
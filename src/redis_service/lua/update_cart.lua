@@ -0,0 +1,12 @@
+-- KEYS[1]: user hash, KEYS[2]: cart hash, ARGV[1]: product id, ARGV[2]: quantity change, ARGV[3]: idle timeout
+if redis.call('HEXISTS', KEYS[1], 'cart_id') == 0 then
+    return false
+end
+
+local quantity = redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+if quantity <= 0 then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+
+return redis.call('HGETALL', KEYS[2])
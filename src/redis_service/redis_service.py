@@ -1,17 +1,175 @@
+from collections import OrderedDict
+from pathlib import Path
 from flask import Flask, request, jsonify
+import threading
+import logging
+import time
+import redis
 import uuid
 import json
 
 from redis_connection import REDIS_CONNECTION
 
 class REDIS_SERVICE:
+    _BASE_DIR = Path(__file__).resolve().parent
+    _SCRIPTS_DIR = "lua"
+    _OPS = {
+        "UpdateCart": _BASE_DIR / _SCRIPTS_DIR / "update_cart.lua",
+        "ReadCart": _BASE_DIR / _SCRIPTS_DIR / "read_cart.lua",
+        "ResetCart": _BASE_DIR / _SCRIPTS_DIR / "reset_cart.lua",
+        "ReapCarts": _BASE_DIR / _SCRIPTS_DIR / "reap_carts.lua",
+        "BootstrapSession": _BASE_DIR / _SCRIPTS_DIR / "bootstrap_session.lua",
+        "TouchSessions": _BASE_DIR / _SCRIPTS_DIR / "touch_sessions.lua"
+    }
+
+    # Valid session ids remembered in-process; entries are rechecked at least every SESSION_CACHE_TTL seconds
+    SESSION_CACHE_SIZE = 10000
+    SESSION_CACHE_TTL = 60
+    # Keyevent notifications for generic (del), expired and evicted keys drive session cache eviction
+    SESSION_EVENT_FLAGS = "Egxe"
+    # Sliding expiry: touched sessions are extended in one pipelined EXPIRE batch per interval
+    SESSION_TIMEOUT = 3600
+    SESSION_TOUCH_INTERVAL_MS = 500
+    # Carts live under cart:{user_id} and expire after CART_IDLE_TTL seconds without activity
+    CART_IDLE_TTL = 7 * 24 * 3600
+    # Orphaned carts are reaped every CART_REAP_INTERVAL seconds, CART_REAP_BATCH keys per SCAN step
+    CART_REAP_INTERVAL = 3600
+    CART_REAP_BATCH = 500
+
     def __init__(self):
         connection = REDIS_CONNECTION()
         self.redis = connection.client
+        # Scripts run with EVALSHA and are reloaded automatically if the server loses them
+        self._scripts = {op: self.redis.register_script(path.read_text()) for op, path in self._OPS.items()}
+
+        self._session_cache = OrderedDict() # session_id -> (monotonic time the entry stops being trusted, timeout)
+        self._session_lock = threading.Lock()
+        self._session_invalidations = 0
+        self._session_cache_enabled = self._watch_sessions()
+
+        self._pending_touches = set()
+        threading.Thread(target=self._touch_loop, name="redis-session-touch", daemon=True).start()
+        threading.Thread(target=self._reap_loop, name="redis-cart-reaper", daemon=True).start()
+
+    def _watch_sessions(self) -> bool:
+        # Evict cached sessions when Redis reports their keys deleted, expired or evicted
+        try:
+            configured = self.redis.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+            covered = set(configured) | (set("g$lshzxe") if "A" in configured else set()) # A is an alias for most classes
+            if missing := "".join(sorted(set(self.SESSION_EVENT_FLAGS) - covered)):
+                # Add only what the session cache needs on top of the operator's configuration
+                self.redis.config_set("notify-keyspace-events", configured + missing)
+                logging.warning(f"Enabled keyspace notification flags '{missing}' (notify-keyspace-events was '{configured}')")
+        except redis.ResponseError as e:
+            logging.warning(f"Keyspace notifications unavailable, session cache disabled: {e}")
+            return False
+
+        db = self.redis.connection_pool.connection_kwargs.get("db", 0)
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{
+            f"__keyevent@{db}__:{event}": self._session_event
+            for event in ("del", "expired", "evicted")
+        })
+        pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._session_watch_failed)
+        return True
+
+    def _session_event(self, message: dict):
+        key = message["data"]
+        if key.startswith("session:"):
+            self._evict_session(key.removeprefix("session:"))
+
+    def _session_watch_failed(self, e: Exception, pubsub, thread):
+        # Notifications may have been missed while the subscription was down
+        logging.warning(f"Session notification stream failed: {e}")
+        with self._session_lock:
+            self._session_invalidations += 1
+            self._session_cache.clear()
+        time.sleep(1)
+
+    def _evict_session(self, session_id: str):
+        with self._session_lock:
+            self._session_invalidations += 1
+            self._session_cache.pop(session_id, None)
+
+    def _cache_session(self, session_id: str, ttl: float, timeout: int, invalidations: int):
+        with self._session_lock:
+            if invalidations != self._session_invalidations: # An eviction raced with the lookup
+                return
+
+            self._session_cache[session_id] = (time.monotonic() + min(ttl, self.SESSION_CACHE_TTL), timeout)
+            self._session_cache.move_to_end(session_id)
+            while len(self._session_cache) > self.SESSION_CACHE_SIZE:
+                self._session_cache.popitem(last=False)
+
+    def _script(self, op: str):
+        if op not in self._scripts:
+            raise KeyError(f"Operation '{op}' not found in available scripts.")
+
+        return self._scripts[op]
+
+    def session_exists(self, session_id: str, touch: bool = False) -> bool:
+        with self._session_lock:
+            if (entry := self._session_cache.get(session_id)) is not None:
+                if entry[0] > time.monotonic():
+                    self._session_cache.move_to_end(session_id)
+                    if touch:
+                        self._pending_touches.add(session_id)
+                    return True
+                del self._session_cache[session_id]
+            invalidations = self._session_invalidations
+
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(f"session:{session_id}")
+            pipe.pttl(f"session:{session_id}")
+            session, ttl = pipe.execute()
+        if session is None:
+            return False
+
+        if self._session_cache_enabled:
+            timeout = json.loads(session).get("timeout", self.SESSION_TIMEOUT)
+            self._cache_session(session_id, ttl / 1000 if ttl >= 0 else self.SESSION_CACHE_TTL, timeout, invalidations)
+        if touch:
+            self.touch_sessions([session_id])
+        return True
+
+    def touch_sessions(self, session_ids: list) -> int:
+        with self._session_lock:
+            self._pending_touches.update(session_ids)
+        return len(session_ids)
+
+    def flush_touches(self) -> int:
+        with self._session_lock:
+            pending, self._pending_touches = list(self._pending_touches), set()
+        if not pending:
+            return 0
+
+        try:
+            # Each session is extended by the timeout stored in its own value, in one round trip
+            applied = self._script("TouchSessions")(
+                keys=[f"session:{session_id}" for session_id in pending],
+                args=[self.SESSION_TIMEOUT]
+            )
+        except redis.RedisError:
+            with self._session_lock: # Retry on the next flush
+                self._pending_touches.update(pending)
+            raise
 
-    def session_exists(self, session_id: str) -> bool:
-        session = self.redis.get(f"session:{session_id}")
-        return session is not None
+        now = time.monotonic()
+        with self._session_lock:
+            for session_id, timeout in zip(pending, applied):
+                if not timeout:
+                    self._session_cache.pop(session_id, None)
+                elif session_id in self._session_cache:
+                    self._session_cache[session_id] = (now + min(timeout, self.SESSION_CACHE_TTL), timeout)
+        return sum(1 for timeout in applied if timeout)
+
+    def _touch_loop(self):
+        while True:
+            time.sleep(self.SESSION_TOUCH_INTERVAL_MS / 1000)
+            try:
+                self.flush_touches()
+            except redis.RedisError as e:
+                logging.warning(f"Failed to extend sessions: {e}")
     
     def user_has_active_session(self, user_id: int) -> bool:
         session_id = self.redis.hget(f"user:{user_id}", "session_id")
@@ -24,14 +182,26 @@ class REDIS_SERVICE:
         session_id = str(uuid.uuid4())
         session_key = f"session:{session_id}"
         
-        self.redis.setex(
-            session_key,
-            timeout,
-            json.dumps({"user_id": user_id})
-        )
-        
-        self.redis.hset(f"user:{user_id}", "session_id", session_id)
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.setex(
+                session_key,
+                timeout,
+                json.dumps({"user_id": user_id, "timeout": timeout})
+            )
+            pipe.hset(f"user:{user_id}", "session_id", session_id)
+            pipe.execute()
+
         return session_id
+
+    def bootstrap_session(self, user_id: int, timeout: int = 3600) -> dict:
+        # Replaces any previous session and gets or creates the cart in one atomic round trip
+        session_id, cart_id, previous_session_id = self._script("BootstrapSession")(
+            keys=[f"user:{user_id}"],
+            args=[str(uuid.uuid4()), timeout, json.dumps({"user_id": user_id, "timeout": timeout}), str(user_id)]
+        )
+        if previous_session_id:
+            self._evict_session(previous_session_id)
+        return {"session_id": session_id, "cart_id": cart_id}
     
     def drop_session(self, user_id: int) -> bool:
         session_id = self.redis.hget(f"user:{user_id}", "session_id")
@@ -39,44 +209,85 @@ class REDIS_SERVICE:
             session_key = f"session:{session_id}"
             self.redis.delete(session_key)
             self.redis.hdel(f"user:{user_id}", "session_id")
+            self._evict_session(session_id)
             return True
         return False
     
     def create_shopping_cart(self, user_id: int) -> str:
-        cart_id = str(uuid.uuid4())
+        # The cart key is derived from the user id; the user hash only records that the cart exists
+        cart_id = str(user_id)
         self.redis.hset(f"user:{user_id}", "cart_id", cart_id)
 
         return cart_id
 
     def delete_shopping_cart(self, user_id: int) -> bool:
-        cart_id = self.redis.hget(f"user:{user_id}", "cart_id")
-        if (cart_id):
-            cart_id = f"cart:{cart_id}"
-            self.redis.delete(cart_id)
-            self.redis.hdel(f"user:{user_id}", "cart_id")
-            return True
-        return False
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(f"cart:{user_id}")
+            pipe.hdel(f"user:{user_id}", "cart_id")
+            _, existed = pipe.execute()
+        return bool(existed)
 
     def get_shopping_cart(self, user_id: int) -> str | None:
         return self.redis.hget(f"user:{user_id}", "cart_id")
     
     def cart_exists(self, user_id: int) -> str | None:
-        return self.redis.hget(f"user:{user_id}", "cart_id") is not None
+        return self.redis.hexists(f"user:{user_id}", "cart_id")
 
-    def update_shopping_cart(self, user_id: str, product_id: int, quantity: int) -> bool:
-        cart_id = self.get_shopping_cart(user_id)
-        cart_key = f"cart:{cart_id}"
-        new_quantity = self.redis.hincrby(cart_key, product_id, quantity)
+    def reset_shopping_cart(self, user_id: int) -> str:
+        return self._script("ResetCart")(
+            keys=[f"user:{user_id}", f"cart:{user_id}"],
+            args=[str(user_id)]
+        )
 
-        if new_quantity <= 0:
-            self.redis.hdel(cart_key, product_id)
-    
-        return self.read_shopping_cart(user_id)
+    def update_shopping_cart(self, user_id: int, product_id: int, quantity: int) -> dict:
+        cart = self._script("UpdateCart")(
+            keys=[f"user:{user_id}", f"cart:{user_id}"],
+            args=[int(product_id), quantity, self.CART_IDLE_TTL]
+        )
+        if cart is None:
+            raise ValueError(f"User {user_id} has no shopping cart")
+
+        return self._to_dict(cart)
     
-    def read_shopping_cart(self, user_id) -> bool:
-        cart_id = self.get_shopping_cart(user_id)
-        cart_key = f"cart:{cart_id}"
-        return self.redis.hgetall(cart_key)
+    def read_shopping_cart(self, user_id) -> dict:
+        cart = self._script("ReadCart")(
+            keys=[f"user:{user_id}", f"cart:{user_id}"],
+            args=[self.CART_IDLE_TTL]
+        )
+        return self._to_dict(cart)
+
+    def reap_carts(self) -> dict:
+        # Incrementally SCAN cart keys and drop those no user points at (including legacy cart:{uuid} keys)
+        report = {"scanned": 0, "reaped": 0, "bytes_reclaimed": 0}
+        batch = []
+        for key in self.redis.scan_iter(match="cart:*", count=self.CART_REAP_BATCH):
+            batch.append(key)
+            if len(batch) >= self.CART_REAP_BATCH:
+                self._reap_batch(batch, report)
+                batch = []
+        if batch:
+            self._reap_batch(batch, report)
+        return report
+
+    def _reap_batch(self, keys: list, report: dict):
+        reaped, reclaimed = self._script("ReapCarts")(keys=keys)
+        report["scanned"] += len(keys)
+        report["reaped"] += reaped
+        report["bytes_reclaimed"] += reclaimed
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.CART_REAP_INTERVAL)
+            try:
+                report = self.reap_carts()
+                logging.info(f"Reaped {report['reaped']} of {report['scanned']} carts, reclaimed {report['bytes_reclaimed']} bytes")
+            except redis.RedisError as e:
+                logging.warning(f"Failed to reap carts: {e}")
+
+    @staticmethod
+    def _to_dict(fields: list) -> dict:
+        # HGETALL replies from Lua arrive as a flat [field, value, ...] list
+        return dict(zip(fields[::2], fields[1::2]))
 
 
 app = Flask(__name__)
@@ -99,15 +310,52 @@ def create_session():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
     
+@app.route('/session/bootstrap', methods=['POST'])
+def bootstrap_session():
+    try:
+        params = request.json if request.is_json else {}
+        user_id = params.get('user_id')
+        timeout = params.get('timeout', 3600)
+        
+        if not isinstance(user_id, int):
+            raise ValueError("'user_id' must be an integer")
+        if not isinstance(timeout, int) or timeout <= 0:
+            raise ValueError("'timeout' must be a positive integer")
+        
+        result = redis_service.bootstrap_session(user_id, timeout)
+        return jsonify({"status": "success", "data": result}), 200
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
 @app.route('/session/session_exists', methods=['GET'])
 def session_exists():
     try:
         session_id = request.args.get('session_id', type=str)
+        touch = request.args.get('touch', default='false').lower() == 'true'
         
         if session_id is None:
             raise ValueError("'session_id' is required")
         
-        result = redis_service.session_exists(session_id)
+        result = redis_service.session_exists(session_id, touch)
+        return jsonify({"status": "success", "data": result}), 200
+    
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    
+@app.route('/session/touch_many', methods=['POST'])
+def touch_sessions():
+    try:
+        params = request.json if request.is_json else {}
+        session_ids = params.get('session_ids')
+        
+        if not isinstance(session_ids, list) or not all(isinstance(x, str) for x in session_ids):
+            raise ValueError("'session_ids' must be a list of strings")
+        
+        result = redis_service.touch_sessions(session_ids)
         return jsonify({"status": "success", "data": result}), 200
     
     except ValueError as e:
@@ -184,6 +432,30 @@ def delete_cart():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/cart/reset', methods=['POST'])
+def reset_cart():
+    try:
+        params = request.json if request.is_json else {}
+        user_id = params.get('user_id')
+        
+        if not isinstance(user_id, int):
+            raise ValueError("'user_id' must be an integer")
+        
+        cart_id = redis_service.reset_shopping_cart(user_id)
+        return jsonify({"status": "success", "data": cart_id}), 200
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/cart/reap', methods=['POST'])
+def reap_carts():
+    try:
+        result = redis_service.reap_carts()
+        return jsonify({"status": "success", "data": result}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/cart/get', methods=['GET'])
 def get_cart():
     try:
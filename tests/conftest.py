@@ -16,21 +16,25 @@ def setup_mongo():
     connection = MONGODB_CONNECTION()
     mongodb = connection.client['polyglot']
     mongodb['statements'].delete_many({})
+    mongodb['purchase_rollups'].delete_many({})
 
     yield
 
     mongodb['statements'].delete_many({})
+    mongodb['purchase_rollups'].delete_many({})
 
 # Cassandra Fixture
 @pytest.fixture(autouse=True)
 def setup_cassandra():
     connection = CASSANDRA_CONNECTION("polyglot_logs")
     cassandra = connection.cluster
-    cassandra.execute("TRUNCATE polyglot_logs.logs")
+    cassandra.execute("TRUNCATE polyglot_logs.logs_by_day")
+    cassandra.execute("TRUNCATE polyglot_logs.log_days")
 
     yield
 
-    cassandra.execute("TRUNCATE polyglot_logs.logs")
+    cassandra.execute("TRUNCATE polyglot_logs.logs_by_day")
+    cassandra.execute("TRUNCATE polyglot_logs.log_days")
 
 # Redis Fixture
 @pytest.fixture(autouse=True)
@@ -1,7 +1,23 @@
 import pytest
+import requests
+import importlib
+import time
+from pathlib import Path
 from datetime import datetime, timezone, timedelta
 
 from src.console_app import ConsoleApp
+from src.cassandra_service.cassandra_connection import CASSANDRA_CONNECTION
+
+@pytest.fixture
+def small_window_service(monkeypatch):
+    # In-process service with a tiny write window; the module imports its connection as a sibling
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[2] / "src" / "cassandra_service"))
+    module = importlib.import_module("cassandra_service")
+
+    class SMALL_WINDOW_SERVICE(module.CASSANDRA_SERVICE):
+        WRITE_PARAMS = {"max_in_flight": 2, "timeout": 0.01}
+
+    return SMALL_WINDOW_SERVICE()
 
 def test_log():
     app = ConsoleApp()
@@ -21,3 +37,105 @@ def test_log():
     assert app._create_log(6, "TestAction2", {"param1": 1, "param2": "value2"}, ["TestTag1", "TestTag2"])
     log = app._read_log(6)
     assert len(app._read_log(6)) == 2
+
+def test_log_async_writes():
+    app = ConsoleApp()
+    written = app._log_stats()['written']
+    for i in range(50):
+        assert app._create_log(6, f"TestAction{i}", {"i": i}, ["TestTag"])
+
+    # Reads wait for the user's queued writes
+    log = app._read_log(6, 100)
+    assert len(log) == 50
+    assert {x["action"] for x in log} == {f"TestAction{i}" for i in range(50)}
+
+    stats = app._log_stats()
+    assert stats['written'] - written == 50
+    assert stats['failed'] == 0
+    assert 0 <= stats['in_flight'] <= stats['max_in_flight']
+
+def test_log_batch():
+    app = ConsoleApp()
+    events = [
+        {'user_id': 6 if i % 3 else 7, 'action': f"TestAction{i}", 'parameters': {"i": i}, 'tags': ["TestTag"]}
+        for i in range(300)
+    ]
+    assert app._create_logs(events) == 300
+
+    log = app._read_log(6, 500)
+    assert len(log) == 200 # Distinct timestamps, so no event overwrote another in its batch
+    assert len(app._read_log(7, 500)) == 100
+    assert app._log_stats()['buffered'] == 0
+
+def test_log_buckets():
+    app = ConsoleApp()
+    for i in range(5):
+        assert app._create_log(6, f"Today{i}", {}, ["TestTag"])
+
+    # Older buckets are written directly; the service only stamps logs with the current time
+    cassandra = CASSANDRA_CONNECTION("polyglot_logs").cluster
+    now = datetime.now(timezone.utc)
+    for days_ago in (2, 4):
+        timestamp = now - timedelta(days=days_ago)
+        cassandra.execute("INSERT INTO log_days (userId, day) VALUES (%s, %s)", (6, timestamp.date()))
+        for i in range(3):
+            cassandra.execute(
+                "INSERT INTO logs_by_day (userId, day, timestamp, action, parameters, tags) VALUES (%s, %s, %s, %s, %s, %s)",
+                (6, timestamp.date(), timestamp - timedelta(minutes=i), f"DaysAgo{days_ago}_{i}", {}, ["TestTag"])
+            )
+
+    pages, token = [], None
+    while True:
+        page, token = app._read_log_page(6, 4, page_token=token)
+        assert len(page) <= 4
+        pages += [x['action'] for x in page]
+        if token is None:
+            break
+    assert pages == [f"Today{i}" for i in reversed(range(5))] + [f"DaysAgo{d}_{i}" for d in (2, 4) for i in range(3)]
+
+    page, token = app._read_log_page(6, 10, since=now - timedelta(days=3), until=now - timedelta(days=1))
+    assert [x['action'] for x in page] == [f"DaysAgo2_{i}" for i in range(3)]
+    assert token is None
+
+def test_log_full_window(small_window_service):
+    service = small_window_service
+    for _ in range(service.WRITE_PARAMS["max_in_flight"]): # Fill the in-flight window
+        service._in_flight.acquire()
+
+    events = [{'user_id': 6, 'action': f"TestAction{i}", 'parameters': {}, 'tags': ["TestTag"]} for i in range(5)]
+    assert service.create_logs(events) == 5
+    time.sleep(0.5) # Background flushes time out waiting for a slot
+
+    stats = service.write_stats()
+    assert stats['buffered'] == 5
+    assert stats['queued'] == 0 and stats['written'] == 0
+
+    for _ in range(service.WRITE_PARAMS["max_in_flight"]):
+        service._in_flight.release()
+    log, _ = service.read_log(6, 10)
+    assert {x["action"] for x in log} == {f"TestAction{i}" for i in range(5)}
+    assert service.write_stats()['buffered'] == 0
+
+def test_log_malformed_event():
+    app = ConsoleApp()
+    for user_id, tags in (("abc", ["TestTag"]), (6, [1])):
+        with pytest.raises(requests.HTTPError) as error:
+            app._create_log(user_id, "Malformed", {}, tags)
+        assert error.value.response.status_code == 400
+
+    assert app._create_log(6, "TestAction", {}, ["TestTag"])
+    assert [x["action"] for x in app._read_log(6)] == ["TestAction"]
+
+def test_log_unbindable_event(small_window_service):
+    # A row that slips past validation is dropped on flush instead of blocking newer events
+    service = small_window_service
+    service.create_log("abc", "Malformed", {}, ["TestTag"])
+    service.create_log(6, "TestAction", {}, ["TestTag"])
+
+    log, _ = service.read_log(6, 10)
+    assert [x["action"] for x in log] == ["TestAction"]
+    stats = service.write_stats()
+    assert stats['failed'] == 1 and stats['buffered'] == 0
+    assert service.create_log(6, "TestAction2", {}, ["TestTag"])
+    log, _ = service.read_log(6, 10)
+    assert {x["action"] for x in log} == {"TestAction", "TestAction2"}
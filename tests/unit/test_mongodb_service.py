@@ -1,4 +1,5 @@
 import pytest
+import requests
 from datetime import datetime, timezone, timedelta
 
 from src.console_app import ConsoleApp
@@ -6,7 +7,7 @@ from src.console_app import ConsoleApp
 def test_statement():
     app = ConsoleApp()
     assert len(app._get_statements(6)) == 0
-    assert app._create_statement(6, {0: 1, 7: 2})
+    assert app._create_statement(6, {0: 1, 7: 2}, {0: 1.0, 7: 2.0})
     
     statements = app._get_statements(6)
     assert len(statements) == 1
@@ -17,7 +18,89 @@ def test_statement():
     print(statement['creation_date'])
     assert abs(datetime.now(timezone.utc) - datetime.strptime(statement['creation_date'], "%a, %d %b %Y %H:%M:%S %Z").replace(tzinfo=timezone.utc)) <= timedelta(minutes=1)
 
-    assert app._create_statement(7, {1: 1, 2: 2})
+    assert app._create_statement(7, {1: 1, 2: 2}, {1: 1.0, 2: 2.0})
     assert len(app._get_statements(6)) == 1
-    assert app._create_statement(6, {1: 1, 2: 2})
-    assert len(app._get_statements(6)) == 2
\ No newline at end of file
+    assert app._create_statement(6, {1: 1, 2: 2}, {1: 1.0, 2: 2.0})
+    assert len(app._get_statements(6)) == 2
+
+def test_statement_create_many():
+    app = ConsoleApp()
+    statement_ids = app._create_statements([
+        {'user_id': 6, 'purchase': {1: 1}, 'prices': {1: 1.0}},
+        {'user_id': 6, 'purchase': {2: 3}, 'prices': {2: 2.0}},
+        {'user_id': 7, 'purchase': {3: 1}, 'prices': {3: 3.0}}
+    ])
+    assert len(set(statement_ids)) == 3
+    assert sorted(app._get_statements(6)) == sorted(statement_ids[:2])
+    assert app._read_statement(statement_ids[1])['purchase'] == {2: 3}
+    assert app._create_statement(6, {4: 1}, {4: 4.0}) not in statement_ids
+
+def test_statement_history():
+    app = ConsoleApp()
+    statement_ids = [app._create_statement(6, {1: 2, 3: 1}, {1: 10.0, 3: 2.5}) for _ in range(5)]
+    other_id = app._create_statement(7, {1: 1}, {1: 10.0})
+
+    page, cursor = app._get_statements_page(6, 2)
+    assert page == statement_ids[::-1][:2] # Newest first
+    pages = page
+    while cursor is not None:
+        page, cursor = app._get_statements_page(6, 2, cursor)
+        pages += page
+    assert pages == statement_ids[::-1]
+
+    summary, _ = app._get_statements_page(6, 1, summary=True)
+    assert summary[0]['_id'] == statement_ids[-1]
+    assert summary[0]['item_count'] == 3
+    assert summary[0]['total'] == 22.5
+    assert 'purchase' not in summary[0]
+
+    assert app._read_statement(statement_ids[0], 6)['purchase'] == {1: 2, 3: 1}
+    with pytest.raises(requests.HTTPError):
+        app._read_statement(other_id, 6)
+
+def test_purchase_analytics():
+    app = ConsoleApp()
+    app._create_statement(6, {1: 2, 3: 1}, {1: 10.0, 3: 2.5})
+    app._create_statement(6, {1: 1}, {1: 10.0})
+    app._create_statement(7, {3: 4}, {3: 2.5})
+
+    spend = app._user_spend(6)
+    assert spend == [{'user_id': 6, 'orders': 2, 'items': 4, 'spend': 32.5}]
+    assert [x['user_id'] for x in app._user_spend()] == [6, 7]
+
+    assert [(x['product_id'], x['qty']) for x in app._top_products(6)] == [(1, 3), (3, 1)]
+    assert [(x['product_id'], x['qty']) for x in app._top_products()] == [(3, 5), (1, 3)]
+    assert app._top_products(limit=1)[0]['spend'] == 12.5
+
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    assert app._monthly_orders(6) == [{'user_id': 6, 'month': month, 'orders': 2, 'spend': 32.5}]
+
+    before = (app._user_spend(), app._top_products(), app._top_products(6), app._monthly_orders(6))
+    assert app._rebuild_rollups() == {'user': 2, 'month': 2, 'product': 3, 'global_product': 2}
+    assert (app._user_spend(), app._top_products(), app._top_products(6), app._monthly_orders(6)) == before
+
+def test_statement_requires_prices():
+    app = ConsoleApp()
+    with pytest.raises(requests.HTTPError) as error:
+        app._create_statement(6, {1: 2}, None)
+    assert error.value.response.status_code == 400
+    with pytest.raises(requests.HTTPError) as error:
+        app._create_statement(6, {1: 2, 3: 1}, {1: 10.0}) # Price for product 3 missing
+    assert error.value.response.status_code == 400
+    with pytest.raises(requests.HTTPError) as error:
+        app._create_statements([{'user_id': 6, 'purchase': {1: 1}}])
+    assert error.value.response.status_code == 400
+
+    # Nothing was written, so rejected statements cannot skew the rollups
+    assert app._get_statements(6) == []
+    assert app._user_spend(6) == []
+
+def test_statement_serialization():
+    app = ConsoleApp()
+    purchase = {i: i % 5 + 1 for i in range(200)}
+    statement_id = app._create_statement(6, purchase, {i: 1.0 for i in purchase})
+
+    assert app._read_statement(statement_id)['purchase'] == purchase
+    summary, _ = app._get_statements_page(6, 1, summary=True)
+    created = datetime.strptime(summary[0]['creation_date'], "%a, %d %b %Y %H:%M:%S %Z").replace(tzinfo=timezone.utc)
+    assert abs(datetime.now(timezone.utc) - created) <= timedelta(minutes=1)
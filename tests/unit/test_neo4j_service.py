@@ -0,0 +1,192 @@
+import pytest
+import importlib
+import numpy as np
+from pathlib import Path
+from scipy import sparse
+from neo4j import READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import Neo4jError
+
+from src.console_app import ConsoleApp
+from src.neo4j_service.neo4j_connection import NEO4J_CONNECTION
+
+# Test nodes live above the seeded ids so rankings only see edges written here
+TEST_USERS = [9001, 9002, 9003, 9004]
+TEST_LAPTOPS = [9001, 9002, 9003, 9004, 9005]
+
+@pytest.fixture
+def graph():
+    connection = NEO4J_CONNECTION()
+    cleanup = "MATCH (n) WHERE (n:User OR n:Laptop) AND n.id >= 9000 DETACH DELETE n"
+    connection.execute_write(cleanup, {})
+    connection.execute_write("UNWIND $ids AS id CREATE (:User {id: id})", {"ids": TEST_USERS})
+    connection.execute_write("UNWIND $ids AS id CREATE (:Laptop {id: id})", {"ids": TEST_LAPTOPS})
+
+    yield connection
+
+    connection.execute_write(cleanup, {})
+    connection.client.close()
+
+@pytest.fixture
+def graph_analytics(monkeypatch):
+    # The analytics job imports its connection as a sibling, as it does when run directly
+    monkeypatch.syspath_prepend(str(Path(__file__).resolve().parents[2] / "src" / "neo4j_service"))
+    return importlib.import_module("graph_analytics").GRAPH_ANALYTICS
+
+def _follow_graph(app: ConsoleApp):
+    # 9001 follows 9002 and 9003 directly and 9004 through 9003; 9001 already owns laptop 9002
+    app._follow_user(9001, 9002)
+    app._follow_user(9001, 9003)
+    app._follow_user(9003, 9004)
+    app._purchase_batch(9002, [9001, 9002, 9004])
+    app._purchase(9003, 9001)
+    app._purchase(9004, 9003)
+    app._purchase(9001, 9002)
+
+def test_recommend_ranking(graph):
+    app = ConsoleApp()
+    _follow_graph(app)
+
+    # 9001: two followees (2.0), 9004: one followee (1.0), 9003: second degree (0.5); 9002 is owned
+    assert app._recommend(9001, mode="live") == [9001, 9004, 9003]
+    assert app._recommend(9001, limit=2, mode="live") == [9001, 9004]
+
+    app._purchase(9001, 9001)
+    assert app._recommend(9001, mode="live") == [9004, 9003]
+
+def test_recommend_precomputed(graph):
+    app = ConsoleApp()
+    _follow_graph(app)
+    app._refresh_recommendations()
+
+    assert app._recommend(9001) == [9001, 9004, 9003]
+    assert app._recommend(9001, limit=1) == [9001]
+    stored = graph.execute_read("MATCH (:User {id: 9001})-[c:CANDIDATE]->(l:Laptop) RETURN l.id AS id ORDER BY c.score DESC", {})
+    assert [x['id'] for x in stored] == [9001, 9004, 9003]
+
+    # Purchases only queue a refresh of the buyer's dependents
+    app._purchase(9003, 9005)
+    app._refresh_recommendations()
+    assert 9005 in app._recommend(9001)
+    assert app._recommend(9002) == [] # Follows nobody
+
+def test_recommend_stale_refresh(graph):
+    app = ConsoleApp()
+    _follow_graph(app)
+    app._refresh_recommendations()
+
+    # Lists older than max_age are recomputed even when nothing they depend on changed
+    graph.execute_write("""
+        MATCH (u:User {id: 9001})-[c:CANDIDATE]->(:Laptop)
+        SET u.candidates_updated = datetime() - duration('P1D')
+        DELETE c
+    """, {})
+    app._refresh_recommendations()
+    assert app._recommend(9001) == [9001, 9004, 9003]
+
+def test_purchase_count(graph):
+    app = ConsoleApp()
+    assert app._purchase(9001, 9001)
+    assert app._purchase(9001, 9001)
+    assert app._purchase_batch(9001, [9001])
+
+    # Repeat purchases increment one edge instead of adding parallel ones
+    edges = graph.execute_read("MATCH (:User {id: 9001})-[p:Purchased]->(:Laptop {id: 9001}) RETURN p.count AS count", {})
+    assert edges == [{'count': 3}]
+
+def test_purchase_batch(graph):
+    app = ConsoleApp()
+    # Duplicates are merged once and unknown laptop ids are skipped
+    assert app._purchase_batch(9002, [9001, 9002, 9002, 99999]) == 2
+    edges = graph.execute_read("MATCH (:User {id: 9002})-[p:Purchased]->(l:Laptop) RETURN l.id AS id, p.count AS count ORDER BY id", {})
+    assert edges == [{'id': 9001, 'count': 1}, {'id': 9002, 'count': 1}]
+    assert app._purchase_batch(9002, [99999]) == 0
+
+def test_id_constraints(graph):
+    constraints = graph.execute_read("SHOW CONSTRAINTS YIELD type, labelsOrTypes, properties", {})
+    unique = {(x['labelsOrTypes'][0], tuple(x['properties'])) for x in constraints if x['type'] == 'UNIQUENESS'}
+    assert {('User', ('id',)), ('Laptop', ('id',))} <= unique
+
+def test_candidate_index(graph):
+    indexes = graph.execute_read("SHOW INDEXES YIELD type, labelsOrTypes, properties", {})
+    assert ('RANGE', ['User'], ['candidates_updated']) in [(x['type'], x['labelsOrTypes'], x['properties']) for x in indexes]
+
+def test_session_routing(graph):
+    # Reads run in read-access sessions, which refuse writes
+    with pytest.raises(Neo4jError):
+        graph.execute_read("CREATE (:User {id: 9999})", {})
+    with graph.session(READ_ACCESS) as session:
+        with pytest.raises(Neo4jError):
+            session.run("CREATE (:User {id: 9999})").consume()
+    with graph.session(WRITE_ACCESS) as session:
+        session.run("MATCH (u:User {id: 9002}) SET u.routing_test = true").consume()
+
+    # The shared bookmark manager makes a write visible to the next read
+    graph.execute_write("MATCH (u:User {id: 9001}) SET u.routing_test = true", {})
+    assert graph.execute_read("MATCH (u:User {id: 9001}) RETURN u.routing_test AS flag", {}) == [{'flag': True}]
+
+def test_graph_export(graph):
+    app = ConsoleApp()
+    _follow_graph(app)
+    app._purchase(9002, 9001) # Second purchase of the same laptop
+
+    written = {
+        ('Follow', 9001, 9002, 1), ('Follow', 9001, 9003, 1), ('Follow', 9003, 9004, 1),
+        ('Purchased', 9002, 9001, 2), ('Purchased', 9002, 9002, 1), ('Purchased', 9002, 9004, 1),
+        ('Purchased', 9003, 9001, 1), ('Purchased', 9004, 9003, 1), ('Purchased', 9001, 9002, 1)
+    }
+    exported = [(x['type'], x['from'], x['to'], x['count']) for x in app._export_graph() if x['from'] in TEST_USERS]
+    assert len(exported) == len(written) # One NDJSON line per edge
+    assert set(exported) == written
+
+# Users x laptops: laptop 0 has buyers {0, 1}, laptop 1 {0, 2}, laptop 2 {1}
+PURCHASES = sparse.csr_matrix(np.array([
+    [1, 1, 0],
+    [1, 0, 1],
+    [0, 1, 0]
+], dtype=np.float64))
+
+def _dense(similarity: sparse.csr_matrix) -> np.ndarray:
+    return similarity.toarray()
+
+def test_laptop_similarity(graph_analytics):
+    expected = np.array([
+        [1.0, 0.5, 1 / np.sqrt(2)],
+        [0.5, 1.0, 0.0],
+        [1 / np.sqrt(2), 0.0, 1.0]
+    ])
+    assert np.allclose(_dense(graph_analytics.laptop_similarity(PURCHASES)), expected)
+
+def test_user_similarity(graph_analytics):
+    expected = np.array([
+        [1.0, 1 / 3, 0.5],
+        [1 / 3, 1.0, 0.0],
+        [0.5, 0.0, 1.0]
+    ])
+    assert np.allclose(_dense(graph_analytics.user_similarity(PURCHASES)), expected)
+
+def test_top_n(graph_analytics):
+    ids = np.array([10, 20, 30])
+    rows = graph_analytics.top_n(graph_analytics.laptop_similarity(PURCHASES), ids, 1)
+    assert [x['id'] for x in rows] == [10, 20, 30] # Every source is listed
+    assert [[y['id'] for y in x['similar']] for x in rows] == [[30], [10], [10]]
+    assert rows[0]['similar'][0]['score'] == pytest.approx(1 / np.sqrt(2))
+
+    # No laptop is similar to itself, and zero scores are not kept
+    rows = graph_analytics.top_n(graph_analytics.laptop_similarity(PURCHASES), ids, 5)
+    assert [[y['id'] for y in x['similar']] for x in rows] == [[30, 20], [10], [10]]
+
+    rows = graph_analytics.top_n(graph_analytics.user_similarity(PURCHASES), ids, 5)
+    assert [[(y['id'], round(y['score'], 4)) for y in x['similar']] for x in rows] == [
+        [(30, 0.5), (20, 0.3333)], [(10, 0.3333)], [(10, 0.5)]
+    ]
+
+def test_recommend_similar(graph, graph_analytics):
+    app = ConsoleApp()
+    # Laptop 9003 shares a buyer with 9001, and user 9002 shares laptop 9001 with user 9001
+    app._purchase_batch(9001, [9001, 9002])
+    app._purchase_batch(9002, [9001, 9003])
+    app._purchase(9003, 9004)
+
+    assert graph_analytics().run()['laptops'] > 0
+    assert app._recommend(9001, mode="similar") == [9003]
+    assert app._recommend(9003, mode="similar") == [] # No co-purchases
@@ -1,6 +1,9 @@
 import pytest
+import requests
+from contextlib import ExitStack
 
 from src.console_app import ConsoleApp
+from src.psql_service.psql_connection import PSQL_CONNECTION
 
 def test_is_admin():
     app = ConsoleApp()
@@ -26,4 +29,136 @@ def test_user_login():
 def test_fetch_products():
     app = ConsoleApp()
     assert len(app._fetch_products({})) != 0
-    assert len(app._fetch_products({"product_type": "Refurbished Laptop"})) != len(app._fetch_products({}))
\ No newline at end of file
+    assert len(app._fetch_products({"product_type": "Refurbished Laptop"})) != len(app._fetch_products({}))
+
+def test_fetch_products_filter_planner():
+    app = ConsoleApp()
+    result = app._fetch_products({"id_in": [1, 2, 3]})
+    assert sorted(r[0] for r in result) == [1, 2, 3]
+    assert app._fetch_products({"Operating system": "AND"}) == []
+    assert app._fetch_products({"price_min": 500, "price_max": 600}) == app._fetch_products({"price_max": 600, "price_min": 500})
+    with pytest.raises(requests.HTTPError):
+        app._fetch_products({"unknown_filter": 1})
+
+def test_fetch_products_pagination():
+    app = ConsoleApp()
+    products = app._fetch_products({})
+    pages, after_id = [], None
+    while True:
+        page, after_id = app._fetch_products_page({}, 30, after_id)
+        pages.extend(page)
+        if after_id is None:
+            break
+    assert [r[0] for r in pages] == sorted(r[0] for r in products)
+    assert list(app._stream_products({"product_type": "Refurbished Laptop"})) == app._fetch_products({"product_type": "Refurbished Laptop"})
+
+def test_pool_stats():
+    app = ConsoleApp()
+    app._fetch_products({})
+    stats = app._pool_stats()
+    assert stats["in_use"] == 0 and stats["waiting"] == 0
+    assert stats["checkouts"] > 0 and stats["maxconn"] >= stats["minconn"]
+
+def test_fetch_facets():
+    app = ConsoleApp()
+    facets = app._fetch_facets({})
+    assert sum(facets["vendor"].values()) == len(app._fetch_products({}))
+
+    facets = app._fetch_facets({"vendor": "HP"})
+    assert facets["vendor"] == {"HP": len(app._fetch_products({"vendor": "HP"}))}
+    for value, count in facets["Disk Type"].items():
+        assert count == len(app._fetch_products({"vendor": "HP", "Disk Type": value}))
+
+def test_fetch_products_attribute_filters():
+    app = ConsoleApp()
+    result = app._fetch_products({"attributes": {"RAM Size": [16, 32]}})
+    assert len(result) != 0
+    assert all(r[8]["RAM Size"] in (16, 32) for r in result)
+    assert len(result) == len(app._fetch_products({"RAM Size": "16"})) + len(app._fetch_products({"RAM Size": "32"}))
+
+    result = app._fetch_products({"attributes": {"Color": "Gray"}})
+    assert all(r[8]["Color"] == "Gray" for r in result)
+
+    result = app._fetch_products({"vendor": "Lenovo", "attributes": {"Screen Size": {"min": 14, "max": 15.6}}})
+    assert len(result) != 0
+    assert all(r[1] == "Lenovo" and 14 <= r[8]["Screen Size"] <= 15.6 for r in result)
+
+    with pytest.raises(requests.HTTPError):
+        app._fetch_products({"attributes": {"Color": {"min": 1}}})
+
+def test_fetch_products_cache():
+    app = ConsoleApp()
+    app._fetch_products({"vendor": "Dell"})
+    hits = app._cache_stats()["products"]["hits"]
+    assert app._fetch_products({"vendor": "Dell"}) == app._fetch_products({"vendor": "Dell"})
+    assert app._cache_stats()["products"]["hits"] >= hits + 2
+
+def test_fetch_products_cold_cache():
+    app = ConsoleApp()
+    app._invalidate_caches()
+    stats = app._cache_stats()
+
+    # The first lookup misses and must reach Postgres; the repeat is served from the cache
+    products = app._fetch_products({"vendor": "Dell"})
+    assert len(products) != 0 and all(r[1] == "Dell" for r in products)
+    facets = app._fetch_facets({})
+    assert facets and isinstance(facets, dict)
+
+    after = app._cache_stats()
+    assert after["products"]["misses"] == stats["products"]["misses"] + 1
+    assert after["facets"]["misses"] == stats["facets"]["misses"] + 1
+    assert app._fetch_products({"vendor": "Dell"}) == products
+    assert app._cache_stats()["products"]["hits"] == after["products"]["hits"] + 1
+
+def test_fetch_products_batch():
+    app = ConsoleApp()
+    result = app._fetch_products_batch([3, 1, 2, 999])
+    assert [r["id"] for r in result] == [1, 2, 3]
+    assert result[0]["vendor"] == app._fetch_products({"id": 1})[0][1]
+
+    result = app._fetch_products_batch([1, 2], ["id", "price", "stock_quantity"])
+    assert all(set(r.keys()) == {"id", "price", "stock_quantity"} for r in result)
+    with pytest.raises(requests.HTTPError):
+        app._fetch_products_batch([1], ["user_password"])
+
+def test_auth_login():
+    app = ConsoleApp()
+    app._invalidate_caches() # Every credential below starts cold and must be checked against Postgres
+    misses = app._cache_stats()["logins"]["misses"]
+    assert app._auth_login("admin", "password") == {"verified": True, "user_id": 1, "admin": True}
+    assert app._auth_login("testuser1", "password1") == {"verified": True, "user_id": 7, "admin": False}
+    assert app._cache_stats()["logins"]["misses"] == misses + 2
+    assert app._auth_login("testuser1", "password1") == {"verified": True, "user_id": 7, "admin": False}
+    assert app._cache_stats()["logins"]["hits"] >= 1
+    assert not app._auth_login("testuser1", "wrongpassword")["verified"]
+    assert app._auth_login("nonexistinguser", "password") == {"verified": False, "user_id": None, "admin": False}
+
+def test_prepared_statements_survive_pool_churn():
+    connection = PSQL_CONNECTION(minconn=0, maxconn=2)
+    assert connection.minconn == 0
+
+    # Each dropped connection is replaced, so every call prepares on a fresh one
+    for i in range(5):
+        with connection.connection() as conn:
+            conn.close()
+        assert connection.execute_prepared("churn_probe", "select $1::int", [i]) == [(i,)]
+    assert connection.stats()["reconnects"] >= 5
+    connection.pool.closeall()
+
+def test_pool_keeps_idle_connections():
+    connection = PSQL_CONNECTION(minconn=0, maxconn=4)
+    with ExitStack() as stack:
+        held = [stack.enter_context(connection.connection()) for _ in range(4)]
+        for conn in held:
+            with conn.cursor() as cur:
+                cur.execute("prepare idle_probe as select 1")
+            conn.prepared.add("idle_probe")
+
+    # Connections above minconn stay open when returned, and later checkouts reuse them with their statements
+    assert not any(conn.closed for conn in held)
+    with ExitStack() as stack:
+        again = [stack.enter_context(connection.connection()) for _ in range(4)]
+    assert {id(x) for x in again} == {id(x) for x in held}
+    assert connection.execute_prepared("idle_probe", "select 1", []) == [(1,)]
+    assert connection.stats()["reconnects"] == 0
+    connection.pool.closeall()
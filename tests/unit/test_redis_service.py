@@ -1,6 +1,10 @@
 import pytest
+import time
+import json
+import uuid
 
 from src.console_app import ConsoleApp
+from src.redis_service.redis_connection import REDIS_CONNECTION
 
 def test_session():
     app = ConsoleApp();
@@ -45,8 +49,128 @@ def test_cart():
     assert app._cart_read(6) == {}
     app._drop_cart(6)
 
+def test_cart_reset():
+    app = ConsoleApp()
+    cart_id = app._create_cart(6)
+    assert app._cart_update(6, 1, 2) == {1: 2}
+    assert app._reset_cart(6) == cart_id
+    assert app._get_user_cart(6) == cart_id
+    assert app._cart_read(6) == {}
+    assert app._cart_update(6, 1, 1) == {1: 1}
+    app._drop_cart(6)
+
+def test_cart_scripts():
+    app = ConsoleApp()
+    redis = REDIS_CONNECTION().client
+    assert app._cart_read(6) == {} # No cart yet
+
+    app._create_cart(6)
+    app._cart_update(6, 3, 2)
+    redis.expire("cart:6", 10)
+    assert app._cart_read(6) == {3: 2}
+    assert redis.ttl("cart:6") > 10 # Reading slides the idle expiry
+
+    app._drop_cart(6)
+    redis.hset("cart:6", "3", 1) # A stale cart hash is never read without the user's cart_id
+    assert app._cart_read(6) == {}
+    assert app._reset_cart(6) == "6"
+    assert not redis.exists("cart:6")
+    assert app._get_user_cart(6) == "6"
+
+def test_session_bootstrap():
+    app = ConsoleApp()
+    first = app._bootstrap_session(6)
+    assert app._session_exists(first['session_id'])
+    assert app._get_user_cart(6) == first['cart_id']
+
+    second = app._bootstrap_session(6)
+    assert second['cart_id'] == first['cart_id']
+    assert app._session_exists(second['session_id'])
+    assert not app._session_exists(first['session_id'])
+    app._drop_session(6)
+    app._drop_cart(6)
+
+def test_session_touch():
+    app = ConsoleApp()
+    redis = REDIS_CONNECTION().client
+    session = app._create_session(6)
+    redis.pexpire(f"session:{session}", 10000)
+    assert app._touch_sessions([session, "RandomSession"]) == 2
+    time.sleep(1) # Touches are applied by the background flush
+    assert redis.pttl(f"session:{session}") > 10000
+    assert app._session_exists(session)
+    app._drop_session(6)
+    assert not app._session_exists(session)
+
+def test_session_touch_own_timeout():
+    app = ConsoleApp()
+    redis = REDIS_CONNECTION().client
+    redis.set("session:TimeoutSession", json.dumps({"user_id": 6, "timeout": 120}), px=5000)
+    app._touch_sessions(["TimeoutSession"])
+    time.sleep(1)
+    assert 5000 < redis.pttl("session:TimeoutSession") <= 120000
+    redis.delete("session:TimeoutSession")
+
+def test_session_touch_on_activity():
+    app = ConsoleApp()
+    redis = REDIS_CONNECTION().client
+    app.login("testuser1", "password1")
+    app.SESSION_TOUCH_INTERVAL = 0
+    redis.pexpire(f"session:{app.active_session}", 10000)
+    app.read_cart()
+    time.sleep(1)
+    assert redis.pttl(f"session:{app.active_session}") > 10000
+    app.logout()
+
+def test_cart_reap():
+    app = ConsoleApp()
+    app._create_cart(6)
+    assert app._cart_update(6, 1, 2) == {1: 2}
+    report = app._reap_carts()
+    assert report["reaped"] == 0 and report["scanned"] >= 1
+    assert app._cart_read(6) == {1: 2}
+
+    # A legacy cart:{uuid} key and a cart:{id} its user no longer points at are both orphaned
+    redis = REDIS_CONNECTION().client
+    legacy = f"cart:{uuid.uuid4()}"
+    redis.hset(legacy, mapping={"1": 2})
+    redis.hset("cart:8", mapping={"3": 1})
+    redis.hset("user:8", mapping={"name": "testuser2"})
+
+    report = app._reap_carts()
+    assert report["reaped"] == 2 and report["bytes_reclaimed"] > 0
+    assert report["scanned"] >= 3
+    assert not redis.exists(legacy) and not redis.exists("cart:8")
+    assert app._cart_read(6) == {1: 2}
+    app._drop_cart(6)
+
+def _wait_until_gone(app, session_id: str, timeout: float = 3) -> bool:
+    # Keyspace notifications reach the service asynchronously
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not app._session_exists(session_id):
+            return True
+        time.sleep(0.05)
+    return False
 
+def test_session_cache_eviction():
+    app = ConsoleApp()
+    redis = REDIS_CONNECTION().client
 
+    deleted = app._create_session(6)
+    assert app._session_exists(deleted) # Cached from here on
+    redis.delete(f"session:{deleted}")
+    assert _wait_until_gone(app, deleted)
 
+    expiring = app._create_session(7)
+    assert app._session_exists(expiring)
+    redis.pexpire(f"session:{expiring}", 50)
+    assert _wait_until_gone(app, expiring)
 
+def test_session_cache_drop():
+    app = ConsoleApp()
+    session = app._create_session(6)
+    assert app._session_exists(session)
+    app._drop_session(6)
+    assert not app._session_exists(session) # drop_session evicts locally, without waiting for the notification
 
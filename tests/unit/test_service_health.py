@@ -9,3 +9,14 @@ def test_service_health():
     app.psql_health == app._check_service_health("REDIS") == True
     app.psql_health == app._check_service_health("MONGODB") == True
     app.psql_health == app._check_service_health("CASSANDRA") == True
+
+def test_http_sessions_reuse_connections():
+    app = ConsoleApp()
+    for _ in range(20):
+        assert app._check_service_health("PSQL")
+
+    # Every call went through the one keep-alive pool for the PSQL host
+    adapter = app._http("PSQL").get_adapter("http://127.0.0.1:5001/")
+    assert len(adapter.poolmanager.pools) == 1
+    assert adapter.timeout == ConsoleApp.HTTP_PARAMS["timeout"]
+    app.close()